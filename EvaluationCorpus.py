@@ -0,0 +1,164 @@
+import sys
+import codecs
+import json
+import uuid
+import numpy as np
+from array import array
+
+
+class EvaluationCorpus():
+    '''In-memory evaluation corpus. Each sentence of the source files is tokenized once
+    and stored as an array of interned word ids, so that the evaluation of a grid does not
+    need any file access or string splitting.
+
+    :param input_corpus: source files containing sentences for the evaluation.
+    :type input_corpus: list of files (`.txt`)
+    :param synonyms_file: JSON file mapping synonyms to their reference word, optional (None by default)
+    :type synonyms_file: file (`.json`)
+    '''
+
+    def __init__(self,input_corpus,synonyms_file = None):
+        '''Constructor'''
+
+        self.files = list(input_corpus)
+
+        #Identifier of the loaded corpus (kept by the copies, e.g. in the worker processes)
+        self.corpus_id = uuid.uuid4().hex
+
+        #Vocabulary of the corpus (id -> word) and interning table (word -> id)
+        self.words = []
+        self.word_ids = dict()
+
+        #Sentences as arrays of word ids
+        self.sentences = []
+
+        #Cached statistics of the corpus
+        self.unigrams = None
+        self.bigrams = dict()
+
+        synonyms_refs = None
+
+        if(synonyms_file != None and synonyms_file.endswith(".json")):
+            #File opening
+            with codecs.open(synonyms_file,"r","utf-8") as file:
+                #Load the synonyms references
+                synonyms_refs = json.load(file)
+
+        for file_path in self.files:
+
+            #The source file is a '.txt' file
+            if(file_path.endswith('.txt')):
+
+                #Source file opening
+                with codecs.open(file_path,"r","utf-8") as rawFile:
+
+                    #For each line in the file, split the line
+                    for line in rawFile:
+                        #Line preparation
+                        line = line.strip()
+                        line = line.split(" ")
+
+                        #Replace the synonyms by their reference
+                        if(synonyms_refs != None):
+                            line = [synonyms_refs.get(word,word) for word in line]
+
+                        self.sentences.append(array('l',[self.intern(word) for word in line]))
+
+            #The source file is not a '.txt' file
+            else:
+                raise Exception("Incorrect file format !")
+
+    def intern(self,word):
+        '''Method to get the id of a word, the word is added to the vocabulary if needed'''
+
+        word_id = self.word_ids.get(word)
+
+        if(word_id == None):
+            word_id = len(self.words)
+            self.words.append(sys.intern(word))
+            self.word_ids.update({self.words[word_id] : word_id})
+
+        return word_id
+
+    def sentence_words(self,sentence):
+        '''Method to get the words of a sentence (array of word ids)'''
+
+        words = self.words
+        return [words[word_id] for word_id in sentence]
+
+    def word_counts(self):
+        '''Method to get the number of occurrences of each word id of the corpus'''
+
+        if(self.unigrams == None):
+            self.unigrams = dict()
+
+            for sentence in self.sentences:
+                for word_id in sentence:
+                    self.unigrams[word_id] = self.unigrams.get(word_id,0) + 1
+
+        return self.unigrams
+
+    def transition_counts(self,skipped_ids = ()):
+        '''Method to get the number of occurrences of each transition (start_id, end_id) of the corpus.
+        The beginning of a sentence is the id -1 and the skipped words are ignored as in the evaluation.
+
+        :param skipped_ids: word ids ignored during the evaluation (stopwords, missmatches)
+        :type skipped_ids: set
+        :return: weighted bigram table
+        :rtype: dict
+        '''
+
+        key = frozenset(skipped_ids)
+
+        if(key not in self.bigrams):
+            transitions = dict()
+
+            for sentence in self.sentences:
+                start_id = -1
+
+                for end_id in sentence:
+                    if(end_id not in key):
+                        transitions[(start_id,end_id)] = transitions.get((start_id,end_id),0) + 1
+                        start_id = end_id
+
+            self.bigrams.update({key : transitions})
+
+        return self.bigrams[key]
+
+    def word_transitions(self,skipped_ids = ()):
+        '''Method to get, for each word id, the indexes (in the bigram table) of the transitions starting or ending with the word'''
+
+        key = (frozenset(skipped_ids),"words")
+
+        if(key not in self.bigrams):
+            word_transitions = dict()
+
+            for idx,(start_id,end_id) in enumerate(self.transition_counts(skipped_ids)):
+                word_transitions.setdefault(end_id,[]).append(idx)
+                if(start_id != -1 and start_id != end_id):
+                    word_transitions.setdefault(start_id,[]).append(idx)
+
+            self.bigrams.update({key : word_transitions})
+
+        return self.bigrams[key]
+
+    def transition_arrays(self,skipped_ids = ()):
+        '''Method to get the weighted bigram table as arrays (start ids, end ids, counts) for the vectorized evaluation'''
+
+        key = (frozenset(skipped_ids),"arrays")
+
+        if(key not in self.bigrams):
+            transitions = self.transition_counts(skipped_ids)
+
+            start_ids = np.fromiter((start_id for start_id,_ in transitions),dtype = np.int64,count = len(transitions))
+            end_ids = np.fromiter((end_id for _,end_id in transitions),dtype = np.int64,count = len(transitions))
+            counts = np.fromiter(transitions.values(),dtype = np.float64,count = len(transitions))
+
+            self.bigrams.update({key : (start_ids,end_ids,counts)})
+
+        return self.bigrams[key]
+
+    def __len__(self):
+        '''Number of sentences of the corpus'''
+
+        return len(self.sentences)
@@ -1,8 +1,12 @@
 import math
 import codecs
+from array import array
 import json
-from PictogramGrid import Grid,Page,Pictogram
+import numpy as np
+from PictogramGrid import Grid,Page,Pictogram,CompiledGrid
 from PageTree import *
+from EvaluationCorpus import EvaluationCorpus
+from utils import SimilarityMatrix,store_similarity_matrix,similarity_vocabulary_file,dict_to_similarity_matrix
 from tqdm import tqdm
 
 
@@ -75,6 +79,88 @@ def cosine_similarity(v_a,v_b):
 # COST COMPUTATION
 #===================================================================
 
+def word_transition_cost(grid,start_word,end_word,start_node,movement_coef = 1,selection_coef = 1):
+    '''Function to compute the cost of the transition between two consecutive words of a sentence.
+    The euler tour of the grid has to be computed before calling this function.
+
+    :param grid: Input grid to evaluate.
+    :type grid: class: Grid
+    :param start_word: Previous word of the sentence ("--start" at the beginning of a sentence)
+    :type start_word: string
+    :param end_word: Next word of the sentence
+    :type end_word: string
+    :param start_node: Page node of the previous word (root node at the beginning of a sentence)
+    :type start_node: class: PageTreeNode
+    :return: cost of the transition and the page node of the next word
+    :rtype: float, class: PageTreeNode
+    '''
+
+    #Find pages containing the word
+    potential_pages = grid.picto_voc[end_word]
+
+    best_distance = math.inf
+    page_pict_dist = math.inf
+    best_path = []
+
+    #For each potential page, computation of the path to keep the smallest
+    for page in potential_pages:
+        end_node = page
+
+        #Computation of the distance at the end
+        end_picto = grid.pages[end_node.page].pictograms[end_word]
+        new_page_pict_dist = euclidean_dist(0,0,end_picto.row,end_picto.col)
+
+        #Computation of the path in the tree
+        result = path_finding(grid.page_tree,start_node,end_node)
+
+        #Keeping the best path
+        if(result[0] + new_page_pict_dist < best_distance + page_pict_dist):
+            best_distance = result[0]
+            best_path = result[1]
+
+    #-----------------------------------------------------------------
+    #COMPUTATION OF THE DISTANCE BETWEEN PICTOGRAMS FOLLOWING THE PATH
+    #-----------------------------------------------------------------
+
+    movement_dist = 0
+    selection_dist = best_distance + 1
+
+    #Get the starting pictogram
+    if(start_word == "--start"):
+        picto_start = Pictogram("--start",0,0,grid.root_name,None,None)
+    else:
+        picto_start = grid.pages[best_path[0].page].pictograms[start_word]
+
+    #print("DEBUG : Best distance : ",best_distance)
+
+    for i in range(len(best_path)):
+
+        #End of the path
+        if(i == best_distance):
+            next_picto = grid.pages[best_path[i].page].pictograms[end_word]
+            #print("DEBUG : End page",picto_start,"-->",next_picto)
+            break
+        
+        #Navigation in the tree
+        else:
+            #Up
+            if(best_path[i].parent == best_path[i+1]):
+                next_picto = Pictogram("--start",0,0,best_path[i+1].page,None,None)
+                #print("DEBUG : UP",picto_start,"-->",next_picto)
+                movement_dist += euclidean_dist(picto_start.row,picto_start.col,next_picto.row,next_picto.col)
+                picto_start = next_picto
+
+            #Down   
+            else:
+                next_picto = grid.pages[best_path[i].page].pictograms[best_path[i+1].page]
+                #print("DEBUG : DOWN",picto_start,"-->",next_picto)
+                movement_dist += euclidean_dist(picto_start.row,picto_start.col,next_picto.row,next_picto.col)
+                picto_start = Pictogram("--start",0,0,best_path[i+1].page,None,None)
+
+    movement_dist += euclidean_dist(picto_start.row,picto_start.col,next_picto.row,next_picto.col)
+
+    return movement_dist * movement_coef + selection_dist * selection_coef, end_node
+
 def sentence_distance_cost(grid,sentence,movement_coef = 1,selection_coef = 1,
                            synonyms_refs = None, missmatch_mode = False, stopwords = []):
 
@@ -84,6 +170,7 @@ def sentence_distance_cost(grid,sentence,movement_coef = 1,selection_coef = 1,
 
     #Beginning of the sentence
     start_word = "--start"
+    start_node = grid.page_tree
     cost = 0
     missmatches = 0
     miss_list = []
@@ -99,9 +186,6 @@ def sentence_distance_cost(grid,sentence,movement_coef = 1,selection_coef = 1,
 
         #print("DEBUG : Words :",start_word,end_word)
 
-        #Potential pages (contain the word)
-        potential_pages = []
-
         #--------------------------------------------------------
         #PATH FINDING BETWEEN THE STARTING WORD AND THE NEXT WORD
         #--------------------------------------------------------
@@ -117,75 +201,10 @@ def sentence_distance_cost(grid,sentence,movement_coef = 1,selection_coef = 1,
                     miss_list.append(end_word)
         
         if(missmatch == False and end_word not in stopwords):
-            #Find pages containing the word
-            potential_pages = grid.picto_voc[end_word]
-
-            #The node is the root at the beginning
-            if(start_word == "--start"):
-                start_node = grid.page_tree
-            
-            best_distance = math.inf
-            page_pict_dist = math.inf
-            best_path = []
-
-            #For each potential page, computation of the path to keep the smallest
-            for page in potential_pages:
-                end_node = page
-
-                #Computation of the distance at the end
-                end_picto = grid.pages[end_node.page].pictograms[end_word]
-                new_page_pict_dist = euclidean_dist(0,0,end_picto.row,end_picto.col)
-
-                #Computation of the path in the tree
-                result = path_finding(grid.page_tree,start_node,end_node)
-
-                #Keeping the best path
-                if(result[0] + new_page_pict_dist < best_distance + page_pict_dist):
-                    best_distance = result[0]
-                    best_path = result[1]
-
-            #-----------------------------------------------------------------
-            #COMPUTATION OF THE DISTANCE BETWEEN PICTOGRAMS FOLLOWING THE PATH
-            #-----------------------------------------------------------------
-
-            movement_dist = 0
-            selection_dist = best_distance + 1
-
-            #Get the starting pictogram
-            if(start_word == "--start"):
-                picto_start = Pictogram("--start",0,0,grid.root_name,None,None)
-            else:
-                picto_start = grid.pages[best_path[0].page].pictograms[start_word]
-
-            #print("DEBUG : Best distance : ",best_distance)
-
-            for i in range(len(best_path)):
-
-                #End of the path
-                if(i == best_distance):
-                    next_picto = grid.pages[best_path[i].page].pictograms[end_word]
-                    #print("DEBUG : End page",picto_start,"-->",next_picto)
-                    break
-                
-                #Navigation in the tree
-                else:
-                    #Up
-                    if(best_path[i].parent == best_path[i+1]):
-                        next_picto = Pictogram("--start",0,0,best_path[i+1].page,None,None)
-                        #print("DEBUG : UP",picto_start,"-->",next_picto)
-                        movement_dist += euclidean_dist(picto_start.row,picto_start.col,next_picto.row,next_picto.col)
-                        picto_start = next_picto
-
-                    #Down   
-                    else:
-                        next_picto = grid.pages[best_path[i].page].pictograms[best_path[i+1].page]
-                        #print("DEBUG : DOWN",picto_start,"-->",next_picto)
-                        movement_dist += euclidean_dist(picto_start.row,picto_start.col,next_picto.row,next_picto.col)
-                        picto_start = Pictogram("--start",0,0,best_path[i+1].page,None,None)
-
-            movement_dist += euclidean_dist(picto_start.row,picto_start.col,next_picto.row,next_picto.col)
-
-            cost += movement_dist * movement_coef + selection_dist * selection_coef
+
+            transition_cost,end_node = word_transition_cost(grid,start_word,end_word,start_node,movement_coef,selection_coef)
+
+            cost += transition_cost
 
             #The end becomes the start for the previous iteration
             start_word = end_word
@@ -193,14 +212,215 @@ def sentence_distance_cost(grid,sentence,movement_coef = 1,selection_coef = 1,
 
     return cost,missmatches,miss_list
 
-def grid_distance_cost(grid,input_corpus,synonyms_file = None,missmatch_mode = False,stopwords = []):
+def skipped_words(grid,input_corpus,missmatch_mode = False,stopwords = []):
+    '''Function to find the words of the corpus ignored during the evaluation (missmatches and stopwords)
+
+    :return: ids of the skipped words, number of missmatches and missing words
+    :rtype: set, integer, set
+    '''
+
+    words = input_corpus.words
+    missmatches = 0
+    miss_list = set()
+    skipped_ids = set()
+
+    for word_id,count in input_corpus.word_counts().items():
+        word = words[word_id]
+
+        #If missmatches are allowed
+        if(missmatch_mode == True and word not in grid.picto_voc):
+            missmatches += count
+            miss_list.add(word)
+            skipped_ids.add(word_id)
+
+        elif(word in stopwords):
+            skipped_ids.add(word_id)
+
+    return skipped_ids,missmatches,miss_list
+
+def bigram_distance_cost(grid,input_corpus,movement_coef = 1,selection_coef = 1,missmatch_mode = False,stopwords = []):
+    '''Function to compute the distance cost of a grid from the weighted transitions of the corpus.
+    Each distinct transition is evaluated once and weighted by its number of occurrences,
+    which gives the same total as the evaluation sentence by sentence.
+
+    :param grid: Input grid to evaluate.
+    :type grid: class: Grid
+    :param input_corpus: preloaded evaluation corpus
+    :type input_corpus: class: EvaluationCorpus
+    :return: cost of the grid, number of missmatches, missing words and the cost of each transition
+    :rtype: float, integer, set, dict
+    '''
+
+    #Computation of the euler tour (just one time is needed)
+    if(grid.page_tree.eulerian_values == None):
+        grid.page_tree.eulerian_values = euler_tour(grid.page_tree,0)
+
+    words = input_corpus.words
+    skipped_ids,missmatches,miss_list = skipped_words(grid,input_corpus,missmatch_mode,stopwords)
+
+    costs = []
+    transition_costs = dict()
+
+    for (start_id,end_id),count in input_corpus.transition_counts(skipped_ids).items():
+
+        transition_cost = bigram_transition_cost(grid,words,start_id,end_id,movement_coef,selection_coef)
+
+        #Beginning of the sentence
+        if(start_id == -1):
+            start_word = "--start"
+        else:
+            start_word = words[start_id]
+
+        transition_costs.update({(start_word,words[end_id]) : transition_cost})
+        costs.append(transition_cost * count)
+
+    return math.fsum(costs),missmatches,miss_list,transition_costs
+
+def bigram_transition_cost(grid,words,start_id,end_id,movement_coef = 1,selection_coef = 1):
+    '''Function to compute the cost of a transition of the bigram table (start_id is -1 at the beginning of a sentence)'''
+
+    #Beginning of the sentence
+    if(start_id == -1):
+        start_word = "--start"
+        start_node = grid.page_tree
+    #The previous word is on the last page recorded for it (as in the sentence evaluation)
+    else:
+        start_word = words[start_id]
+        start_node = grid.picto_voc[start_word][-1]
+
+    transition_cost,_ = word_transition_cost(grid,start_word,words[end_id],start_node,movement_coef,selection_coef)
+
+    return transition_cost
+
+def incremental_distance_cost(grid,input_corpus,movement_coef = 1,selection_coef = 1,missmatch_mode = False,stopwords = []):
+    '''Function to compute the distance cost of a grid by updating the transition costs stored in the grid.
+    Only the transitions of the words modified since the last evaluation (recorded by the pages) are recomputed.
+    The pages record their modifications only after a first incremental evaluation, the other modes do not pay for it.
+    A modification of a directory pictogram changes the tree or the navigation, all transitions are then recomputed.
+    The result is exactly the one of a complete evaluation.
+
+    :param grid: Input grid to evaluate.
+    :type grid: class: Grid
+    :param input_corpus: preloaded evaluation corpus
+    :type input_corpus: class: EvaluationCorpus
+    :return: cost of the grid, number of missmatches, missing words and the cost of each transition
+    :rtype: float, integer, set, array
+    '''
+
+    #Computation of the euler tour (just one time is needed)
+    if(grid.page_tree.eulerian_values == None):
+        grid.page_tree.eulerian_values = euler_tour(grid.page_tree,0)
+
+    words = input_corpus.words
+    skipped_ids,missmatches,miss_list = skipped_words(grid,input_corpus,missmatch_mode,stopwords)
+    key = (input_corpus.corpus_id,frozenset(skipped_ids))
+    transitions = input_corpus.transition_counts(skipped_ids)
+    transition_list = list(transitions)
+
+    #Words modified since the last evaluation (the pages record them from now on)
+    modified_words = set()
+    untracked = False
+    for page in grid.pages.values():
+        if(page.modified_words == None):
+            untracked = True
+        else:
+            modified_words.update(page.modified_words)
+        page.modified_words = set()
+
+    #Complete evaluation (no previous evaluation, other bigram table (corpus or skipped words), modifications not recorded
+    #or directory pictogram modified), the costs are stored by position in the bigram table of the previous evaluation
+    if(grid.distance_state == None or untracked or grid.distance_state[0] != key or grid.distance_state[1] != (movement_coef,selection_coef)
+       or any(word in grid.pages for word in modified_words)):
+
+        transition_costs = array('d',[bigram_transition_cost(grid,words,start_id,end_id,movement_coef,selection_coef)
+                                      for start_id,end_id in transition_list])
+
+    #Update of the transitions of the modified words only
+    else:
+        transition_costs = grid.distance_state[2]
+        word_transitions = input_corpus.word_transitions(skipped_ids)
+
+        updated = set()
+        for word in modified_words:
+            word_id = input_corpus.word_ids.get(word)
+            if(word_id != None):
+                updated.update(word_transitions.get(word_id,()))
+
+        for idx in updated:
+            start_id,end_id = transition_list[idx]
+            transition_costs[idx] = bigram_transition_cost(grid,words,start_id,end_id,movement_coef,selection_coef)
+
+    grid.distance_state = (key,(movement_coef,selection_coef),transition_costs)
+
+    counts = transitions.values()
+    return math.fsum([cost * count for cost,count in zip(transition_costs,counts)]),missmatches,miss_list,transition_costs
+
+def compiled_distance_cost(compiled,start_ids,end_ids,movement_coef = 1,selection_coef = 1):
+    '''Function to compute with array operations the cost of a batch of word transitions in a compiled grid.
+    It follows the same navigation as word_transition_cost : going up a page is done from the pictogram at (0,0),
+    going down from the directory pictogram, and each page change is a selection.
+
+    :param compiled: compiled grid
+    :type compiled: class: CompiledGrid
+    :param start_ids: word ids of the previous words (-1 for the beginning of a sentence)
+    :type start_ids: numpy array
+    :param end_ids: word ids of the next words
+    :type end_ids: numpy array
+    :return: cost of each transition
+    :rtype: numpy array
+    '''
+
+    is_start = start_ids < 0
+    start_ids = np.where(is_start,0,start_ids)
+
+    #Pages and positions of the pictograms (the beginning of a sentence is at (0,0) in the root page)
+    start_pages = np.where(is_start,0,compiled.word_page[start_ids])
+    start_rows = np.where(is_start,0,compiled.word_row[start_ids])
+    start_cols = np.where(is_start,0,compiled.word_col[start_ids])
+
+    end_pages = compiled.word_page[end_ids]
+    end_rows = compiled.word_row[end_ids]
+    end_cols = compiled.word_col[end_ids]
+
+    #Path in the page tree
+    lca = compiled.lca(start_pages,end_pages)
+    lca_depth = compiled.depth[lca]
+    distance = compiled.depth[start_pages] + compiled.depth[end_pages] - 2 * lca_depth
+    go_up = start_pages != lca
+    go_down = end_pages != lca
+
+    #Going up : from the starting pictogram to (0,0), then (0,0) on each page
+    movement_dist = np.where(go_up,np.hypot(start_rows,start_cols),0)
+    current_rows = np.where(go_up,0,start_rows)
+    current_cols = np.where(go_up,0,start_cols)
+
+    #Going down : to the first directory pictogram, then from (0,0) to the next directories
+    first_pages = compiled.lift(end_pages,np.maximum(compiled.depth[end_pages] - lca_depth - 1,0))
+    first_dist = np.hypot(current_rows - compiled.dir_row[first_pages],current_cols - compiled.dir_col[first_pages])
+    next_dist = compiled.dir_path_dist[end_pages] - compiled.dir_path_dist[first_pages]
+    movement_dist = movement_dist + np.where(go_down,first_dist + next_dist,0)
+    current_rows = np.where(go_down,0,current_rows)
+    current_cols = np.where(go_down,0,current_cols)
+
+    #Last movement to the pictogram of the next word
+    movement_dist = movement_dist + np.hypot(current_rows - end_rows,current_cols - end_cols)
+
+    return movement_dist * movement_coef + (distance + 1) * selection_coef
+
+def grid_distance_cost(grid,input_corpus,synonyms_file = None,missmatch_mode = False,stopwords = [],mode = "sentence"):
 
     '''Main function to compute the cost of a given grid and a source file.
 
     :param grid: Input grid to evalute its cost.
     :type grid: class: Grid
-    :param input_file: source file containing sentences for the evaluation.
-    :type input_file: file (`.txt`)
+    :param input_corpus: preloaded corpus or source files containing sentences for the evaluation.
+    :type input_corpus: class: EvaluationCorpus or list of files (`.txt`)
+    :param synonyms_file: JSON file of the synonyms, only used when the corpus is loaded from files.
+    :type synonyms_file: file (`.json`)
+    :param mode: "sentence" evaluates each sentence word by word, "bigram" evaluates each distinct transition once,
+                 "compiled" evaluates all distinct transitions with array operations on the compiled grid,
+                 "incremental" only evaluates the transitions of the words modified since the last evaluation of the grid.
+    :type mode: string
     :return: cost of the grid for the input file. 
     :rtype: float
     '''
@@ -211,68 +431,97 @@ def grid_distance_cost(grid,input_corpus,synonyms_file = None,missmatch_mode = F
     missmatch_list = []
     n = 0
 
-    synonyms_refs = None
+    #Load the corpus if the source files are given
+    if(not isinstance(input_corpus,EvaluationCorpus)):
+        input_corpus = EvaluationCorpus(input_corpus,synonyms_file)
 
-    if(synonyms_file != None and synonyms_file.endswith(".json")):
-        #File opening
-        file = codecs.open(synonyms_file,"r","utf-8")
+    #Weighted transitions evaluation (the statistics contain the cost of each transition)
+    if(mode == "bigram"):
+        cost,missmatches,missmatch_list,transition_costs = bigram_distance_cost(grid,input_corpus,missmatch_mode=missmatch_mode,stopwords=stopwords)
+        return cost,missmatches,missmatch_list,[transition_costs]
 
-        #Load the similarity matrix
-        synonyms_refs = json.load(file)
-    
-    for file_path in input_corpus:
-
-        #The source file is a '.txt' file
-        if(file_path.endswith('.txt')):
-
-            #Source file opening
-            with codecs.open(file_path,"r","utf-8") as rawFile:
-
-                #For each line in the file, split the line
-                for line in rawFile:
-                    #Line preparation
-                    line = line.strip()
-                    line = line.split(" ")
-                    #Cost computation
-                    results = sentence_distance_cost(grid,line,synonyms_refs = synonyms_refs,missmatch_mode=missmatch_mode,stopwords=stopwords)
-
-                    #Saving results
-                    cost+=results[0]
-                    sentence_costs.append(results[0])
-                    missmatches+=results[1]
-                    missmatch_list = missmatch_list + results[2]
-
-                    n += 1
-                    
-        #The source file is not a '.txt' file
-        else:
-            raise Exception("Incorrect file format !")
+    #Incremental evaluation (the statistics contain the cost of each transition of the bigram table)
+    elif(mode == "incremental"):
+        cost,missmatches,missmatch_list,transition_costs = incremental_distance_cost(grid,input_corpus,missmatch_mode=missmatch_mode,stopwords=stopwords)
+        return cost,missmatches,missmatch_list,[transition_costs]
+
+    #Vectorized evaluation (the statistics contain the cost of each transition of the bigram table)
+    elif(mode == "compiled"):
+        skipped_ids,missmatches,missmatch_list = skipped_words(grid,input_corpus,missmatch_mode,stopwords)
+        start_ids,end_ids,counts = input_corpus.transition_arrays(skipped_ids)
+
+        compiled = grid.compile(input_corpus.words)
+
+        #Words of the corpus missing in the grid
+        missing = compiled.word_page[end_ids] < 0
+        if(missing.any()):
+            raise KeyError(input_corpus.words[end_ids[missing][0]])
+
+        transition_costs = compiled_distance_cost(compiled,start_ids,end_ids)
+        return float(np.dot(transition_costs,counts)),missmatches,missmatch_list,[transition_costs]
+
+    elif(mode != "sentence"):
+        raise Exception("Unknown evaluation mode !")
+
+    for sentence in input_corpus.sentences:
+
+        #Cost computation
+        results = sentence_distance_cost(grid,input_corpus.sentence_words(sentence),missmatch_mode=missmatch_mode,stopwords=stopwords)
+
+        #Saving results
+        cost+=results[0]
+        sentence_costs.append(results[0])
+        missmatches+=results[1]
+        missmatch_list = missmatch_list + results[2]
+
+        n += 1
     
     stats = [sentence_costs]
     #Return the cost
     return cost,missmatches,set(missmatch_list),stats
 
-def compute_word_similarities(voc,model):
-    '''Function to compute the similarities between all words and returns a dictionary'''
-    sim_matrix = dict()
+def compute_word_similarities(voc,model,output_file = None,chunk_size = 1024):
+    '''Function to compute the distances (1 - cosine similarity) between all words.
+    Each word vector is fetched once, the distances are computed by blocks of rows with matrix products.
+
+    :param voc: vocabulary
+    :type voc: list
+    :param model: object providing the vectors of the words (get_word_vector)
+    :type model: model
+    :param output_file: file where the matrix is written (`.npy` written block by block, or `.json`), optional (None by default)
+    :type output_file: file
+    :param chunk_size: number of rows computed at once (bounds the memory), optional (1024 by default)
+    :type chunk_size: integer
+    :return: similarity matrix
+    :rtype: class: SimilarityMatrix
+    '''
 
-    for i in tqdm(range(len(voc)),desc = "Similarities computation ",unit = "word"):
-        
-        wi = voc[i]
-        wi_sims = dict()
+    #Get the vector of each word and normalize them (null vectors have a similarity of 0)
+    vectors = np.array([model.get_word_vector(word) for word in voc],dtype = np.float64)
+    norms = np.linalg.norm(vectors,axis = 1)
+    norms[norms == 0] = 1
+    vectors = vectors / norms[:,None]
 
-        #Get the vector of the word wi
-        vec_wi = model.get_word_vector(wi)
+    #Output store
+    if(output_file != None and output_file.endswith(".npy")):
+        matrix = np.lib.format.open_memmap(output_file,mode = "w+",dtype = np.float32,shape = (len(voc),len(voc)))
 
-        for wj in voc:
+        with codecs.open(similarity_vocabulary_file(output_file),"w","utf-8") as vocabulary_file:
+            vocabulary_file.write(json.dumps(list(voc)))
+    else:
+        matrix = np.empty((len(voc),len(voc)),dtype = np.float32)
 
-            #Compute the similarity between the two words
-            word_score = 1 - cosine_similarity(vec_wi,model.get_word_vector(wj))
-            #Store it
-            wi_sims.update({wj : word_score})
+    for start in tqdm(range(0,len(voc),chunk_size),desc = "Similarities computation ",unit = "block"):
+        
+        #Compute the similarities of a block of words with all words
+        matrix[start:start + chunk_size] = 1 - vectors[start:start + chunk_size] @ vectors.T
+
+    sim_matrix = SimilarityMatrix(voc,matrix)
 
-        #Store all similarities with the word wi
-        sim_matrix.update({wi : wi_sims})
+    if(output_file != None and output_file.endswith(".npy")):
+        matrix.flush()
+    elif(output_file != None):
+        store_similarity_matrix(sim_matrix,output_file)
 
     return sim_matrix
 
@@ -298,8 +547,80 @@ def page_similarity_cost(page,sim_matrix):
     
     return cost
 
+class SimilarityEvaluator():
+    '''Similarity (coherence) evaluator of the pages working on word ids and a dense matrix.
+    The cost of a page is the sum of the submatrix of its words, cached by set of words,
+    so only the pages modified since their last evaluation are recomputed.
+
+    :param sim_matrix: similarity matrix (dictionary of dictionaries or SimilarityMatrix)
+    :type sim_matrix: dict or class: SimilarityMatrix
+    :param cache_size: maximal number of page costs kept in the cache, optional (100000 by default)
+    :type cache_size: integer
+    '''
+
+    def __init__(self,sim_matrix,cache_size = 100000):
+        '''Constructor'''
+
+        if(not isinstance(sim_matrix,SimilarityMatrix)):
+            sim_matrix = dict_to_similarity_matrix(sim_matrix,dtype = np.float64)
+
+        self.sim_matrix = sim_matrix
+        self.word_ids = sim_matrix.word_ids
+        self.cache_size = cache_size
+        self.page_costs = dict()
+
+    def page_key(self,page):
+        '''Method to get the key of a page in the cache (sorted ids of its words)'''
+
+        word_ids = self.word_ids
+        return tuple(sorted([word_ids[word] for word in page.get_words()]))
+
+    def page_cost(self,page):
+        '''Method to get the similarity cost of a page'''
+
+        key = self.page_key(page)
+        cost = self.page_costs.get(key)
+
+        if(cost == None):
+            ids = np.array(key,dtype = np.int64)
+            cost = float(self.sim_matrix.matrix[np.ix_(ids,ids)].sum(dtype = np.float64))
+
+            #Bounded cache
+            if(len(self.page_costs) >= self.cache_size):
+                self.page_costs.clear()
+            self.page_costs.update({key : cost})
+
+        return cost
+
+    def grid_cost(self,grid):
+        '''Method to get the similarity cost of an entire grid'''
+
+        cost = 0
+
+        for page in grid.pages.values():
+            cost += self.page_cost(page)
+
+        return cost
+
+    def update_similarity_scores(self,grid):
+        '''Method to fill the similarity score of the pictograms of a grid (before its export)'''
+
+        for page in grid.pages.values():
+            words = page.get_words()
+
+            if(words):
+                ids = np.array([self.word_ids[word] for word in words],dtype = np.int64)
+                word_scores = self.sim_matrix.matrix[np.ix_(ids,ids)].sum(axis = 1,dtype = np.float64)
+
+                for word,word_score in zip(words,word_scores):
+                    page.pictograms[word].similarity_score = 1 - (float(word_score) / page.nb_picto)
+
 def grid_similarity_cost(grid,sim_matrix):
-    '''Function to compute the similarity cost of an entire grid'''
+    '''Function to compute the similarity cost of an entire grid.
+    With a SimilarityEvaluator, the similarity scores of the pictograms are not updated (see update_similarity_scores).'''
+
+    if(isinstance(sim_matrix,SimilarityEvaluator)):
+        return sim_matrix.grid_cost(grid)
 
     cost = 0
 
@@ -310,12 +631,12 @@ def grid_similarity_cost(grid,sim_matrix):
 
     return cost
 
-def grid_cost(grid,input_corpus,sim_matrix,similarity_coefficient = 0.5,synonyms_file = None, missmatch_mode = False):
+def grid_cost(grid,input_corpus,sim_matrix,similarity_coefficient = 0.5,synonyms_file = None, missmatch_mode = False, mode = "sentence"):
     '''Function to evaluate a grid depending on the similarity coefficient'''
 
     #If the cost is only depending on the distance
     if(similarity_coefficient == 0):
-        dist,_,_,_ =  grid_distance_cost(grid,input_corpus,synonyms_file,missmatch_mode)
+        dist,_,_,_ =  grid_distance_cost(grid,input_corpus,synonyms_file,missmatch_mode,mode = mode)
         return math.log10(dist)
 
     #If the cost is only depending on the similarity
@@ -325,7 +646,7 @@ def grid_cost(grid,input_corpus,sim_matrix,similarity_coefficient = 0.5,synonyms
 
     #Hybrid format
     else:
-        dist,_,_,_ = grid_distance_cost(grid,input_corpus)
+        dist,_,_,_ = grid_distance_cost(grid,input_corpus,mode = mode)
         sim = grid_similarity_cost(grid,sim_matrix)
 
         return math.log10(sim) * similarity_coefficient + math.log10(dist) * (1 - similarity_coefficient)
\ No newline at end of file
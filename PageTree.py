@@ -17,6 +17,9 @@ class PageTreeNode():
         self.depth = 0
         self.eulerian_values = None
 
+        #Page name -> node index, shared by all the nodes of the tree
+        self.nodes_index = {page_name : self}
+
     def insert_child(self,new_node):
         '''Method to insert a child to the current node'''
 
@@ -27,6 +30,12 @@ class PageTreeNode():
         #Append the new node
         self.children.append(new_node)
 
+        #Register the nodes of the new subtree in the index of the tree (not needed when re-parenting)
+        if(new_node.nodes_index is not self.nodes_index):
+            for node in new_node.nodes_index.values():
+                node.nodes_index = self.nodes_index
+                self.nodes_index.update({node.page : node})
+
     def depth_update(self,node,parent_depth):
         '''Method to update the depth of all nodes'''
 
@@ -37,27 +46,51 @@ class PageTreeNode():
             child.depth_update(child,node.depth)
 
     def find_node(self,page_name):
-        '''Method to find and return particular node following a DFS'''
-
-        #Initialisation of the sets
-        nodes = [self]
-        visited = []
-
-        while nodes:
-            current_node = nodes.pop()
-            #Target node is found
-            if(current_node.page == page_name):
-                return current_node
-            #Target node is not found
-            else:
-                if(current_node not in visited):
-                    visited.append(current_node)
-                    for child in current_node.children:
-                        nodes.append(child)
-        
-        print("Node not found !")
-        return None
-            
+        '''Method to find and return particular node of the tree from the page index'''
+
+        node = self.nodes_index.get(page_name)
+
+        if(node == None):
+            print("Node not found !")
+
+        return node
+
+    def lca_values(self):
+        '''Method to get the precomputed LCA structure of the tree (euler tour and sparse table), built if needed.
+        The structure has to be reset (eulerian_values = None) when the tree is modified.'''
+
+        if(self.eulerian_values == None):
+            self.eulerian_values = euler_tour(self,0)
+
+        return self.eulerian_values
+
+    def page_distance(self,start_node,end_node):
+        '''Method to get in constant time the distance between two nodes of the tree'''
+
+        self.lca_values()
+
+        return distance_finding(self,start_node,end_node)
+
+    def distance_matrix(self):
+        '''Method to compute the distances between all pairs of pages of the tree
+
+        :return: names of the pages and the matrix of the distances (same order)
+        :rtype: list, list
+        '''
+
+        first_indexes = self.lca_values()[2]
+
+        #Nodes in the order of the tour
+        nodes = list(first_indexes)
+        matrix = [[0] * len(nodes) for _ in nodes]
+
+        for i in range(len(nodes)):
+            for j in range(i + 1,len(nodes)):
+                distance = distance_finding(self,nodes[i],nodes[j])
+                matrix[i][j] = distance
+                matrix[j][i] = distance
+
+        return [[node.page for node in nodes],matrix]
 
     #=========================================================================================================================
     # DISPLAY METHOD OF THE PAGE TREE
@@ -102,6 +135,45 @@ def dfs(node,euler_nodes,depths,node_depth = 0):
         dfs(child,euler_nodes,depths,child.depth)
         visit(node,euler_nodes,depths,node_depth)
 
+def sparse_table(depths):
+    '''Function to build the sparse table of the euler tour depths (range minimum queries).
+    table[k][i] is the index of the minimal depth in the interval [i, i + 2^k[
+    '''
+
+    table = [list(range(len(depths)))]
+
+    k = 1
+    while (1 << k) <= len(depths):
+        previous = table[k - 1]
+        half = 1 << (k - 1)
+        level = []
+
+        for i in range(len(depths) - (1 << k) + 1):
+            left = previous[i]
+            right = previous[i + half]
+            #Keep the leftmost index in case of equality
+            if(depths[right] < depths[left]):
+                level.append(right)
+            else:
+                level.append(left)
+
+        table.append(level)
+        k += 1
+
+    return table
+
+def range_minimum(table,depths,start_idx,end_idx):
+    '''Function to find in constant time the index of the minimal depth in the interval [start_idx, end_idx['''
+
+    k = (end_idx - start_idx).bit_length() - 1
+    left = table[k][start_idx]
+    right = table[k][end_idx - (1 << k)]
+
+    if(depths[right] < depths[left]):
+        return right
+    else:
+        return left
+
 def euler_tour(node,node_depth):
     '''Function to compute the euler tour of a page tree'''
 
@@ -113,13 +185,13 @@ def euler_tour(node,node_depth):
     #Deep first search
     dfs(node,euler_nodes,depths,node_depth)
 
-    for node in euler_nodes:
+    for idx,node in enumerate(euler_nodes):
         if(node not in first_indexes):
-            first_indexes.update({node : euler_nodes.index(node)})
+            first_indexes.update({node : idx})
 
-    return [euler_nodes,depths,first_indexes]
+    return [euler_nodes,depths,first_indexes,sparse_table(depths)]
 
-def find_lca(start_node,end_node,depths,first_indexes):
+def find_lca(start_node,end_node,depths,first_indexes,table = None):
     '''Function to find the lca between to nodes in a tree'''
 
     #Find the indexes of the interval in the euler tour
@@ -127,6 +199,10 @@ def find_lca(start_node,end_node,depths,first_indexes):
     if(end_node in first_indexes):
         end_idx = first_indexes[end_node]
 
+    #Constant time query with the sparse table
+    if(table != None):
+        return [start_idx,end_idx,range_minimum(table,depths,min(start_idx,end_idx),max(start_idx,end_idx))]
+
     #Return the indexes : start, end, lca
     return [start_idx,end_idx,depths.index(min(depths[min(start_idx,end_idx):max(start_idx,end_idx)]),min(start_idx,end_idx),max(start_idx,end_idx))]
 
@@ -176,7 +252,7 @@ def path_finding(root,start_node,end_node):
     #If the two nodes are not the same
     else:
         #Find the lca between two nodes
-        lca = find_lca(start_node,end_node,root.eulerian_values[1],root.eulerian_values[2])
+        lca = find_lca(start_node,end_node,root.eulerian_values[1],root.eulerian_values[2],root.eulerian_values[3])
 
         #Get the distance between the two nodes
         distance = nodes_distance(lca[0],lca[1],lca[2],root.eulerian_values[1])
@@ -185,4 +261,15 @@ def path_finding(root,start_node,end_node):
         path = nodes_path(lca[0],lca[1],lca[2],root.eulerian_values[0])
 
         #Return the distance and the path
-        return [distance,path]
\ No newline at end of file
+        return [distance,path]
+
+def distance_finding(root,start_node,end_node):
+    '''Function to return in constant time the distance between two nodes (without the path)'''
+
+    #If the two nodes are the same (same pages)
+    if(start_node == end_node):
+        return 0
+
+    lca = find_lca(start_node,end_node,root.eulerian_values[1],root.eulerian_values[2],root.eulerian_values[3])
+
+    return nodes_distance(lca[0],lca[1],lca[2],root.eulerian_values[1])
@@ -1,7 +1,12 @@
 import math
+import heapq
 import random
 import csv
 import json
+import hashlib
+import numpy as np
+from copy import deepcopy
+from array import array
 from utils import *
 from PageTree import PageTreeNode
 
@@ -89,6 +94,103 @@ class Page():
         #Full indicator (False, the page is not full)
         self.is_full = False
 
+        #Words of the pictograms modified since the last incremental evaluation (None : not recorded, no incremental evaluation state)
+        self.modified_words = None
+
+        #Digest of the pictograms of the page (None : to compute again, the page was modified)
+        self.layout_digest = None
+
+        #Number of pictograms in each slot (row-major) and heap of the free slots (lazy deletion)
+        self.occupancy = [0] * (self.row_size * self.col_size)
+        self.free_slots = list(range(self.row_size * self.col_size))
+
+        #Pictogram of each slot (row-major, None if the slot is empty)
+        self.slots = [None] * (self.row_size * self.col_size)
+
+    def record_modification(self,*words):
+        '''Method to record a modification of the pictograms of the page : the layout digest is reset and the words are recorded
+        once the page is followed by an incremental evaluation'''
+
+        self.layout_digest = None
+
+        if(self.modified_words != None):
+            self.modified_words.update(words)
+
+    def digest(self):
+        '''Method to get the digest of the pictograms of the page (slot, word and directory indicator), computed again only after a modification'''
+
+        if(self.layout_digest == None):
+            pictos = sorted((picto.row,picto.col,picto.word,picto.is_directory == True) for picto in self.pictograms.values())
+            self.layout_digest = hashlib.blake2b(repr(pictos).encode("utf-8"),digest_size = 16).digest()
+
+        return self.layout_digest
+
+    def slot_index(self,row,col):
+        '''Method to get the index of a slot of the page (None if the position is outside the page)'''
+
+        if(0 <= row < self.row_size and 0 <= col < self.col_size):
+            return row * self.col_size + col
+
+        return None
+
+    def occupy_slot(self,picto):
+        '''Method to record a pictogram in its slot'''
+
+        idx = self.slot_index(picto.row,picto.col)
+
+        if(idx != None):
+            self.occupancy[idx] += 1
+            self.slots[idx] = picto
+
+    def release_slot(self,picto):
+        '''Method to record the removal of a pictogram from its slot'''
+
+        idx = self.slot_index(picto.row,picto.col)
+
+        if(idx != None):
+            self.occupancy[idx] -= 1
+
+            #The slot is free again
+            if(self.occupancy[idx] == 0):
+                heapq.heappush(self.free_slots,idx)
+                self.slots[idx] = None
+
+            #Another pictogram is still in the slot
+            elif(self.slots[idx] is picto):
+                for other in self.pictograms.values():
+                    if(other is not picto and other.row == picto.row and other.col == picto.col):
+                        self.slots[idx] = other
+
+    def set_slot(self,picto):
+        '''Method to set the pictogram of a slot (the slot stays occupied)'''
+
+        idx = self.slot_index(picto.row,picto.col)
+
+        if(idx != None):
+            self.slots[idx] = picto
+
+    def replace_slot(self,word):
+        '''Method to release the slot of the pictogram of a word before it is replaced by a new pictogram'''
+
+        if(word in self.pictograms):
+            self.release_slot(self.pictograms[word])
+
+    def pictogram_at(self,row,col):
+        '''Method to get the pictogram at the position [row,col] of the page (None if the slot is empty)'''
+
+        idx = self.slot_index(row,col)
+
+        if(idx != None):
+            return self.slots[idx]
+
+        #Position outside the page
+        found = None
+        for picto in self.pictograms.values():
+            if(picto.row == row and picto.col == col):
+                found = picto
+
+        return found
+
     def get_words(self):
         '''Method to get the words of the page'''
         words = []
@@ -101,7 +203,7 @@ class Page():
         return words
 
     def update_next_slot(self):
-        '''Method to update the new free slot of the page'''
+        '''Method to update the new free slot of the page (first free slot in row-major order)'''
 
         #Page is full
         if(self.nb_picto == self.row_size * self.col_size):
@@ -112,27 +214,13 @@ class Page():
         #Page not full
         else:
 
-            find = False
-
-            #Find the next free slot
-            for i in range(self.row_size):
+            #Remove the slots occupied since they were freed
+            while self.free_slots and self.occupancy[self.free_slots[0]] > 0:
+                heapq.heappop(self.free_slots)
 
-                for j in range(self.col_size):
-                        
-                    if(find == False):
-                        save = True
-
-                        for picto in self.pictograms.values():
-
-                            #The slot [i,j] is not empty
-                            if(picto.row == i and picto.col == j):
-                                save = False
-
-                        #The slot [i,j] is empty
-                        if(save == True):
-                            self.next_row = i
-                            self.next_col = j
-                            find = True
+            #Next free slot
+            if(self.free_slots):
+                self.next_row,self.next_col = divmod(self.free_slots[0],self.col_size)
 
     def add_word_to_pictogram(self,word,is_directory = False,warnings = True):
         '''Method to add a pictogram to the page from a word'''
@@ -147,8 +235,11 @@ class Page():
 
             #Create the pictogram and add it to the page
             picto = Pictogram(word,self.next_row,self.next_col,self.name,word+"@"+self.name,is_directory = is_directory)
+            self.replace_slot(picto.word)
             self.pictograms.update({picto.word : picto})
             self.nb_picto += 1
+            self.record_modification(word)
+            self.occupy_slot(picto)
 
             #Next position
             self.update_next_slot()
@@ -158,8 +249,11 @@ class Page():
     def add_pictogram(self,pictogram):
         '''Method to add an existing pictogram to the page'''
 
+        self.replace_slot(pictogram.word)
         self.pictograms.update({pictogram.word : pictogram})
         self.nb_picto += 1
+        self.record_modification(pictogram.word)
+        self.occupy_slot(pictogram)
 
         #Next position
         self.update_next_slot()
@@ -167,8 +261,10 @@ class Page():
     def remove_word_to_pictogram(self,word):
         '''Method to remove a pictogram of a page'''
 
-        self.pictograms.pop(word)
+        picto = self.pictograms.pop(word)
         self.nb_picto -= 1
+        self.record_modification(word)
+        self.release_slot(picto)
 
         self.is_full = False
 
@@ -189,6 +285,12 @@ class Page():
         picto_a.row = tmp_row
         picto_a.col = tmp_col
 
+        #Update the slots
+        self.set_slot(picto_b)
+        self.set_slot(picto_a)
+
+        self.record_modification(picto_a.word,picto_b.word)
+
     def __str__(self):
         '''Display the pictograms of the page (text)'''
 
@@ -210,9 +312,14 @@ class Grid():
     :type input_file: file (.csv or .txt)
     :param randomizer: If True, the generation of the grid will be random, else, it will follow the input file.
     :type randomizer: boolean (True by default)
+    :param vocabulary: ordered vocabulary placed in the grid instead of the vocabulary of the `.txt` corpus, optional (None by default)
+    :type vocabulary: list
+
+    With input_file = None, an empty grid is created (filled by CompactGrid.to_grid).
     '''
 
-    def __init__(self,input_file,root_name = "accueil",randomizer = True,warnings = True,page_row_size = 5,page_col_size = 5,synonyms_file = None):
+    def __init__(self,input_file,root_name = "accueil",randomizer = True,warnings = True,page_row_size = 5,page_col_size = 5,synonyms_file = None,
+                 vocabulary = None):
         '''Constructor''' 
 
         self.root_name = root_name
@@ -221,6 +328,9 @@ class Grid():
         self.picto_voc = dict()
         self.nb_picto = 0
 
+        #Transition costs of the last incremental evaluation
+        self.distance_state = None
+
         #Dimension of the pages
         self.page_row = page_row_size
         self.page_col = page_col_size
@@ -228,8 +338,8 @@ class Grid():
         self.randomizer = randomizer
         self.warnings = warnings
         if(isinstance(input_file, list)):
-            self.generate_grid(input_file)
-        elif(input_file.endswith(".csv")):
+            self.generate_grid(input_file,vocabulary)
+        elif(input_file != None and input_file.endswith(".csv")):
             self.load_grid(input_file,synonyms_file)
     
     def load_grid(self,input_file,synonyms_file = None):
@@ -314,18 +424,20 @@ class Grid():
 
             page.update_next_slot()
 
-    def generate_grid(self,input_file):
+    def generate_grid(self,input_file,vocabulary = None):
         '''Encapsulation function.
         Generate a grid from a file.
 
         :param input_file: source file
         :type input_file: file
+        :param vocabulary: ordered vocabulary used instead of the vocabulary of the source file, optional (None by default)
+        :type vocabulary: list
         :raises Exception: Not accepted file format !
         '''
 
         #'.txt file'
         if(input_file[0].endswith(".txt")):
-            self.generate_grid_from_txt(input_file)
+            self.generate_grid_from_txt(input_file,vocabulary)
 
     def generate_grid_structure(self,voc):
         '''Generate an empty grid structure (tree and directory pictograms) from the vocabulary
@@ -398,15 +510,20 @@ class Grid():
             #Update the parent pictogram for the link between pages
             self.pages[new_name].parent_picto = self.pages[parent.page].pictograms[new_name]
 
-    def generate_grid_from_txt(self,corpus):
+    def generate_grid_from_txt(self,corpus,vocabulary = None):
         '''Generate a grid from a .txt corpus
 
         :param corpus: source text file list containing the corpus
         :type corpus: `.txt` file list
+        :param vocabulary: ordered vocabulary used instead of the vocabulary of the corpus, optional (None by default)
+        :type vocabulary: list
         '''
 
         #Get the vocabulary of the corpus and the number of pictograms
-        voc = get_vocabulary_from_corpus(corpus)
+        if(vocabulary == None):
+            voc = get_vocabulary_from_corpus(corpus)
+        else:
+            voc = list(vocabulary)
 
         self.generate_grid_structure(voc)
 
@@ -445,6 +562,29 @@ class Grid():
                 if(page_queue):
                     current_page = page_queue.pop(0)
     
+    def sort_pages(self,frequencies):
+        '''Method to move the most frequent words of each page to the slots closest to the cell (0,0).
+        The directory pictograms are not moved.
+
+        :param frequencies: number of occurrences of each word (0 for the missing words)
+        :type frequencies: dict
+        '''
+
+        for page in self.pages.values():
+            pictos = [picto for picto in page.pictograms.values() if picto.is_directory == False]
+
+            #Slots of the words of the page, closest to the cell (0,0) first
+            cells = sorted(((picto.row,picto.col) for picto in pictos),key = lambda cell : (cell[0]**2 + cell[1]**2,cell))
+
+            #Words of the page, most frequent first
+            pictos.sort(key = lambda picto : -frequencies.get(picto.word,0))
+
+            for picto,(row,col) in zip(pictos,cells):
+                other = page.pictogram_at(row,col)
+
+                if(other is not picto and other != None):
+                    page.swap_pictograms(picto,other)
+
     def swap_pictograms(self,picto_a,picto_b):
         '''Method to swap two pictograms in the whole grid'''
 
@@ -507,6 +647,61 @@ class Grid():
         self.pages[picto_a.page_name].pictograms.update({new_picto_b.word : new_picto_b})
         self.pages[picto_b.page_name].pictograms.update({new_picto_a.word : new_picto_a})
 
+        self.pages[picto_a.page_name].set_slot(new_picto_b)
+        self.pages[picto_b.page_name].set_slot(new_picto_a)
+
+        self.pages[picto_a.page_name].record_modification(picto_a.word,picto_b.word)
+        self.pages[picto_b.page_name].record_modification(picto_a.word,picto_b.word)
+
+
+    def fingerprint(self):
+        '''Method to get a canonical fingerprint of the layout of the grid : page tree, pictograms of each slot
+        and order of the pages of the words placed in several pages (the evaluation uses this order).
+        It does not depend on the order of the pages and of the pictograms in the dictionaries,
+        two grids with the same fingerprint have the same evaluation.
+        The digests of the pages are kept until the pages are modified, so only the modified pages are hashed again.
+
+        :return: hexadecimal digest of the layout
+        :rtype: string
+        '''
+
+        #Fields separated by the ASCII unit separator, records by the record separator
+        pages = []
+        for name,page in self.pages.items():
+            node = self.page_tree.find_node(name)
+            parent = node.parent.page if node.parent != None else ""
+
+            pages.append(name+"\x1f"+parent+"\x1f"+page.digest().hex())
+
+        pages.sort()
+
+        #Pages of the words placed in several pages
+        voc = sorted(word+"\x1f"+"\x1f".join([node.page for node in nodes]) for word,nodes in self.picto_voc.items() if len(nodes) > 1)
+
+        layout = str(self.page_row)+"\x1f"+str(self.page_col)+"\x1d"+"\x1e".join(pages)+"\x1d"+"\x1e".join(voc)
+
+        return hashlib.blake2b(layout.encode("utf-8"),digest_size = 16).hexdigest()
+
+    def compile(self,vocabulary = None):
+        '''Method to export the grid into its compiled (array) representation
+
+        :param vocabulary: words indexing the word arrays, optional (vocabulary of the grid by default)
+        :type vocabulary: list
+        :return: compiled grid
+        :rtype: class: CompiledGrid
+        '''
+
+        return CompiledGrid(self,vocabulary)
+
+    def compact(self):
+        '''Method to export the grid into its compact (genome) representation
+
+        :return: compact grid
+        :rtype: class: CompactGrid
+        '''
+
+        return CompactGrid(self)
+
 
   #=========================================================================================================================
 
@@ -551,4 +746,275 @@ class Grid():
         print("================PAGES===============\n")
         for p in self.pages.values():
             print(p.name,"("+str(p.row_size)+"x"+str(p.col_size)+")",", "+str(len(p.pictograms)),"pictograms")
-        print("\n====================================")
\ No newline at end of file
+        print("\n====================================")
+
+
+class CompiledGrid():
+    '''Array representation of a grid used by the vectorized evaluation.
+    Pages and words are replaced by integer ids.
+
+    :param grid: grid to compile
+    :type grid: class: Grid
+    :param vocabulary: words indexing the word arrays, optional (vocabulary of the grid by default)
+    :type vocabulary: list
+    '''
+
+    def __init__(self,grid,vocabulary = None):
+        '''Constructor'''
+
+        if(vocabulary == None):
+            vocabulary = list(grid.picto_voc)
+
+        #Page ids (the root page is always the id 0)
+        self.page_names = [grid.root_name] + [name for name in grid.pages if name != grid.root_name]
+        self.page_ids = {name : i for i,name in enumerate(self.page_names)}
+        nb_pages = len(self.page_names)
+
+        #Page tree (parent of the root is the root itself), depth and directory slot in the parent page
+        self.parent = np.zeros(nb_pages,dtype = np.int64)
+        self.depth = np.zeros(nb_pages,dtype = np.int64)
+        self.dir_row = np.zeros(nb_pages,dtype = np.float64)
+        self.dir_col = np.zeros(nb_pages,dtype = np.float64)
+
+        nodes = [grid.page_tree]
+
+        while nodes:
+            node = nodes.pop()
+            page_id = self.page_ids[node.page]
+            self.depth[page_id] = node.depth
+
+            if(node.parent != None):
+                self.parent[page_id] = self.page_ids[node.parent.page]
+                dir_picto = grid.pages[node.parent.page].pictograms[node.page]
+                self.dir_row[page_id] = dir_picto.row
+                self.dir_col[page_id] = dir_picto.col
+
+            nodes.extend(node.children)
+
+        #Distance of the directory pictograms from the page origin and cumulated from the root
+        dir_dist = np.hypot(self.dir_row,self.dir_col)
+        self.dir_path_dist = np.zeros(nb_pages,dtype = np.float64)
+
+        for page_id in np.argsort(self.depth,kind = "stable"):
+            if(page_id != 0):
+                self.dir_path_dist[page_id] = self.dir_path_dist[self.parent[page_id]] + dir_dist[page_id]
+
+        #Ancestors table (binary lifting) : ancestors[k][p] is the 2^k-th ancestor of p
+        self.ancestors = [self.parent]
+        for _ in range(1,max(1,int(self.depth.max()).bit_length())):
+            self.ancestors.append(self.ancestors[-1][self.ancestors[-1]])
+
+        #Words (page of the last pictogram of the word, -1 if the word is not in the grid)
+        self.words = list(vocabulary)
+        self.word_page = np.full(len(self.words),-1,dtype = np.int64)
+        self.word_row = np.zeros(len(self.words),dtype = np.float64)
+        self.word_col = np.zeros(len(self.words),dtype = np.float64)
+
+        for i,word in enumerate(self.words):
+            if(word in grid.picto_voc):
+                page_name = grid.picto_voc[word][-1].page
+                picto = grid.pages[page_name].pictograms[word]
+                self.word_page[i] = self.page_ids[page_name]
+                self.word_row[i] = picto.row
+                self.word_col[i] = picto.col
+
+    def lift(self,pages,steps):
+        '''Method to get the ancestors of pages, each one a given number of steps above'''
+
+        for k in range(len(self.ancestors)):
+            pages = np.where((steps >> k) & 1,self.ancestors[k][pages],pages)
+
+        return pages
+
+    def lca(self,pages_a,pages_b):
+        '''Method to get the lowest common ancestors of two arrays of pages'''
+
+        #Bring both pages at the same depth
+        deeper = self.depth[pages_a] < self.depth[pages_b]
+        pages_a,pages_b = np.where(deeper,pages_b,pages_a),np.where(deeper,pages_a,pages_b)
+        pages_a = self.lift(pages_a,self.depth[pages_a] - self.depth[pages_b])
+
+        #Go up until the parents are the same
+        for k in reversed(range(len(self.ancestors))):
+            up_a = self.ancestors[k][pages_a]
+            up_b = self.ancestors[k][pages_b]
+            diff = up_a != up_b
+            pages_a = np.where(diff,up_a,pages_a)
+            pages_b = np.where(diff,up_b,pages_b)
+
+        return np.where(pages_a == pages_b,pages_a,self.parent[pages_a])
+
+
+
+class CompactGrid():
+    '''Compact genome of a grid made of flat integer arrays, cheap to copy and to serialize.
+    Each pictogram is a slot (page id, row, col) holding a word id, the page tree is an array of parents.
+    The order of the pages, of the pictograms in each page and of the pages of each word is kept,
+    so that to_grid rebuilds a grid evaluated and mutated exactly as the original one.
+    The identifiers of the pictograms are rebuilt as word@page.
+
+    :param grid: grid to convert
+    :type grid: class: Grid
+    '''
+
+    def __init__(self,grid):
+        '''Constructor'''
+
+        self.root_name = grid.root_name
+        self.page_row = grid.page_row
+        self.page_col = grid.page_col
+        self.nb_picto = grid.nb_picto
+
+        #Pages (id -> name) and words (id -> word), shared by the clones
+        self.page_names = list(grid.pages)
+        self.words = []
+        page_ids = {name : i for i,name in enumerate(self.page_names)}
+        word_ids = dict()
+
+        #Page tree : parent of each page (-1 for the root) and order of insertion of the nodes (BFS)
+        self.parent = array('l',[-1] * len(self.page_names))
+        self.tree_order = array('l')
+
+        nodes = [grid.page_tree]
+        while nodes:
+            node = nodes.pop(0)
+            self.tree_order.append(page_ids[node.page])
+            if(node.parent != None):
+                self.parent[page_ids[node.page]] = page_ids[node.parent.page]
+            nodes.extend(node.children)
+
+        #Slots of the pictograms (in the order of the pages and of their pictograms)
+        self.slot_page = array('l')
+        self.slot_row = array('l')
+        self.slot_col = array('l')
+        self.slot_word = array('l')
+        self.slot_dir = array('b')
+        self.slot_score = []
+
+        #State of the pages (number of pictograms, full indicator and next free slot)
+        self.page_nb_picto = array('l')
+        self.page_full = array('b')
+        self.page_next_row = array('l')
+        self.page_next_col = array('l')
+
+        for name,page in grid.pages.items():
+            self.page_nb_picto.append(page.nb_picto)
+            self.page_full.append(page.is_full == True)
+            self.page_next_row.append(page.next_row)
+            self.page_next_col.append(page.next_col)
+
+            for picto in page.pictograms.values():
+                if(picto.word not in word_ids):
+                    word_ids.update({picto.word : len(self.words)})
+                    self.words.append(picto.word)
+
+                self.slot_page.append(page_ids[name])
+                self.slot_row.append(picto.row)
+                self.slot_col.append(picto.col)
+                self.slot_word.append(word_ids[picto.word])
+                self.slot_dir.append(picto.is_directory == True)
+                self.slot_score.append(picto.similarity_score)
+
+        #Pages of each word (CSR arrays in the order of picto_voc)
+        self.voc_words = array('l')
+        self.voc_offsets = array('l',[0])
+        self.voc_pages = array('l')
+
+        for word,nodes in grid.picto_voc.items():
+            if(word not in word_ids):
+                word_ids.update({word : len(self.words)})
+                self.words.append(word)
+
+            self.voc_words.append(word_ids[word])
+            self.voc_pages.extend(page_ids[node.page] for node in nodes)
+            self.voc_offsets.append(len(self.voc_pages))
+
+    def clone(self):
+        '''Method to copy the compact grid (array copies, the names of the pages and words are shared)'''
+
+        new_grid = CompactGrid.__new__(CompactGrid)
+        new_grid.__dict__.update(self.__dict__)
+
+        for name,value in self.__dict__.items():
+            if(isinstance(value,array)):
+                setattr(new_grid,name,value[:])
+
+        new_grid.slot_score = self.slot_score[:]
+
+        if(hasattr(self,"fitness")):
+            new_grid.fitness = deepcopy(self.fitness)
+
+        return new_grid
+
+    def __deepcopy__(self,memo):
+        '''Deep copy of the compact grid (checkpoints, migrations) is the hand-written clone'''
+
+        return self.clone()
+
+    def to_grid(self,container = None):
+        '''Method to rebuild the grid from the compact representation
+
+        :param container: class of the grid to build, optional (Grid by default)
+        :type container: class
+        :return: rebuilt grid
+        :rtype: class: Grid
+        '''
+
+        if(container == None):
+            container = Grid
+
+        grid = container(None,root_name = self.root_name,randomizer = False,warnings = False,
+                         page_row_size = self.page_row,page_col_size = self.page_col)
+        grid.nb_picto = self.nb_picto
+
+        #Pages
+        pages = []
+        for page_id,name in enumerate(self.page_names):
+            page = Page(name,self.page_row,self.page_col)
+            page.nb_picto = self.page_nb_picto[page_id]
+            page.is_full = self.page_full[page_id] == 1
+            page.next_row = self.page_next_row[page_id]
+            page.next_col = self.page_next_col[page_id]
+            grid.pages.update({name : page})
+            pages.append(page)
+
+        #Page tree
+        nodes = [PageTreeNode(name) for name in self.page_names]
+        grid.page_tree = nodes[self.tree_order[0]]
+
+        for page_id in self.tree_order[1:]:
+            nodes[self.parent[page_id]].insert_child(nodes[page_id])
+
+        #Pictograms
+        for i in range(len(self.slot_word)):
+            word = self.words[self.slot_word[i]]
+            page = pages[self.slot_page[i]]
+
+            if(self.slot_dir[i]):
+                picto = Pictogram(word,self.slot_row[i],self.slot_col[i],page.name,word+"@"+page.name,True,self.slot_score[i],word)
+            else:
+                picto = Pictogram(word,self.slot_row[i],self.slot_col[i],page.name,word+"@"+page.name,similarity_score = self.slot_score[i])
+
+            page.pictograms.update({word : picto})
+            page.occupy_slot(picto)
+
+        for page_id,page in enumerate(pages):
+            #Link between the page and its directory pictogram
+            if(self.parent[page_id] != -1):
+                page.parent_picto = pages[self.parent[page_id]].pictograms.get(page.name)
+
+        #Pages of each word
+        for i,word_id in enumerate(self.voc_words):
+            grid.picto_voc.update({self.words[word_id] : [nodes[page_id] for page_id in self.voc_pages[self.voc_offsets[i]:self.voc_offsets[i+1]]]})
+
+        return grid
+
+    def to_csv(self,output_file = "default.csv"):
+        '''Method to transform the compact grid into a csv file'''
+
+        self.to_grid().to_csv(output_file)
+
+    def display_information(self):
+        '''Method to display the general information of the compact grid'''
+
+        self.to_grid().display_information()
@@ -0,0 +1,276 @@
+import os
+import sys
+import math
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+from copy import deepcopy
+
+from PictogramGrid import Grid
+from EvaluationCorpus import EvaluationCorpus
+from EvaluationGrid import grid_distance_cost,grid_similarity_cost,SimilarityEvaluator
+import utils
+from utils import SimilarityMatrix
+from gpgo import gpgo,init_creator,clone_individual
+from deap import creator
+from synthetic_data import zipf_corpus,random_grid
+
+#===============================================
+# BENCHMARK SUITE
+#===============================================
+
+#Fixed seed of every benchmark
+SEED = 0
+
+#Vocabulary sizes of the synthetic corpora (Zipf corpora of 20 words per word of the vocabulary)
+VOCABULARY_SIZES = [100,1000,10000]
+
+#Vocabulary size of the synthetic random grid
+RANDOM_GRID_SIZE = 10000
+
+TRAINING_CORPUS = ["training_corpora/animals_corpus.txt","training_corpora/chat_souris_5x5_corpus.txt"]
+PODD_GRID = "grids/podd.csv"
+
+def random_similarity_matrix(grid,seed = SEED):
+    '''Function to build a random similarity matrix on the vocabulary of a grid'''
+
+    words = list(grid.picto_voc)
+    rng = np.random.default_rng(seed)
+
+    return SimilarityMatrix(words,rng.random((len(words),len(words)),dtype = np.float32))
+
+def grid_swaps(grid,nb_swaps = 1000,seed = SEED):
+    '''Function returning a benchmark of swaps of random pictograms of random pages (as the mutations of the optimizer)'''
+
+    pages = list(grid.pages.values())
+
+    def run():
+        rng = random.Random(seed)
+
+        for i in range(nb_swaps):
+            picto_a = rng.choice(list(rng.choice(pages).pictograms.values()))
+            picto_b = rng.choice(list(rng.choice(pages).pictograms.values()))
+            grid.swap_pictograms(picto_a,picto_b)
+
+    return run
+
+def genetic_run(corpus,gen_number,pop_size = 20):
+    '''Function returning a benchmark of the genetic algorithm (initial population and gen_number generations)'''
+
+    def run():
+        optimizer = gpgo(corpus,corpus,pop_size = pop_size,select_number = pop_size // 2,gen_number = gen_number,
+                         similarity_coefficient = 0)
+        optimizer.genetic_algorithm()
+
+    return run
+
+def benchmarks(data_dir):
+    '''Function returning the benchmarks of the suite : list of (name, setup function returning the function to measure).
+    The setup is not measured.'''
+
+    suite = []
+
+    #Grid loading
+    suite.append(("load_grid_podd",lambda : (lambda : Grid(PODD_GRID))))
+
+    #Synthetic random grid
+    random_grid_file = os.path.join(data_dir,"grid_"+str(RANDOM_GRID_SIZE)+".csv")
+    random_grid_corpus = [os.path.join(data_dir,"synthetic_"+str(RANDOM_GRID_SIZE)+".txt")]
+    suite.append(("load_grid_random_"+str(RANDOM_GRID_SIZE),lambda : (lambda : Grid(random_grid_file))))
+
+    def setup():
+        grid = Grid(random_grid_file)
+        evaluation_corpus = EvaluationCorpus(random_grid_corpus)
+        return lambda : grid_distance_cost(grid,evaluation_corpus,mode = "compiled")
+
+    suite.append(("distance_cost_random_"+str(RANDOM_GRID_SIZE)+"_compiled",setup))
+
+    #Grid generation
+    for nb_words in VOCABULARY_SIZES:
+        corpus = [os.path.join(data_dir,"synthetic_"+str(nb_words)+".txt")]
+        suite.append(("generate_grid_"+str(nb_words),lambda corpus = corpus : (lambda : Grid(corpus,warnings = False))))
+
+    #Distance cost
+    evaluation_sets = [("training",TRAINING_CORPUS),("synthetic_1000",[os.path.join(data_dir,"synthetic_1000.txt")])]
+
+    for corpus_name,corpus in evaluation_sets:
+        for mode in ["sentence","bigram","compiled"]:
+            def setup(corpus = corpus,mode = mode):
+                grid = Grid(corpus,warnings = False)
+                evaluation_corpus = EvaluationCorpus(corpus)
+                return lambda : grid_distance_cost(grid,evaluation_corpus,mode = mode)
+
+            suite.append(("distance_cost_"+corpus_name+"_"+mode,setup))
+
+        #Similarity cost
+        def setup(corpus = corpus):
+            grid = Grid(corpus,warnings = False)
+            sim_matrix = random_similarity_matrix(grid)
+            return lambda : grid_similarity_cost(grid,sim_matrix)
+
+        suite.append(("similarity_cost_"+corpus_name,setup))
+
+        def setup(corpus = corpus):
+            grid = Grid(corpus,warnings = False)
+            sim_matrix = random_similarity_matrix(grid)
+            return lambda : grid_similarity_cost(grid,SimilarityEvaluator(sim_matrix))
+
+        suite.append(("similarity_evaluator_"+corpus_name,setup))
+
+    #Grid operations
+    synthetic_1000 = [os.path.join(data_dir,"synthetic_1000.txt")]
+    suite.append(("swap_pictograms_synthetic_1000",lambda : grid_swaps(Grid(synthetic_1000,warnings = False))))
+    suite.append(("deepcopy_podd",lambda : (lambda grid = Grid(PODD_GRID) : deepcopy(grid))))
+    suite.append(("fingerprint_podd",lambda : (lambda grid = Grid(PODD_GRID) : grid.fingerprint())))
+
+    def setup():
+        init_creator()
+        individual = creator.Individual(PODD_GRID)
+        return lambda : clone_individual(individual)
+
+    suite.append(("clone_individual_podd",setup))
+
+    #Genetic algorithm
+    suite.append(("ga_initialization",lambda : genetic_run(TRAINING_CORPUS,0)))
+    suite.append(("ga_one_generation",lambda : genetic_run(TRAINING_CORPUS,1)))
+
+    return suite
+
+def consistency_checks():
+    '''Function to check that the evaluation modes give the cost of the sentence mode, also when the same grid
+    is evaluated successively on different corpora (incremental state of another bigram table).
+    Returns the descriptions of the failed checks.'''
+
+    failures = []
+
+    grid = Grid(TRAINING_CORPUS,randomizer = False,warnings = False)
+    corpora = [EvaluationCorpus([corpus_file]) for corpus_file in TRAINING_CORPUS + TRAINING_CORPUS[:1]]
+
+    for corpus_file,evaluation_corpus in zip(TRAINING_CORPUS + TRAINING_CORPUS[:1],corpora):
+        reference = grid_distance_cost(grid,evaluation_corpus,missmatch_mode = True,mode = "sentence")[0]
+
+        for mode in ["bigram","compiled","incremental"]:
+            cost = grid_distance_cost(grid,evaluation_corpus,missmatch_mode = True,mode = mode)[0]
+
+            if(not math.isclose(cost,reference,rel_tol = 1e-9)):
+                failures.append(mode+" on "+os.path.basename(corpus_file)+" : "+str(cost)+" (sentence : "+str(reference)+")")
+
+    return failures
+
+def clear_caches():
+    '''Function to empty the module caches (corpus vocabularies and similarity matrices), so every execution
+    of a benchmark does the same work whatever the number of repetitions'''
+
+    utils.corpus_frequencies.clear()
+    utils.similarity_matrices.clear()
+
+def measure(setup,repeat):
+    '''Function to measure a benchmark : best time over the repetitions and peak memory (tracemalloc) of one execution.
+    The caches are emptied before each setup.
+
+    :param setup: setup function returning the function to measure
+    :type setup: function
+    :param repeat: number of measured executions
+    :type repeat: integer
+    :return: time (seconds) and peak memory (bytes)
+    :rtype: dict
+    '''
+
+    times = []
+
+    for i in range(repeat):
+        random.seed(SEED)
+        clear_caches()
+        run = setup()
+
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    #Peak memory of one execution (tracemalloc slows down the execution, it is measured apart)
+    random.seed(SEED)
+    clear_caches()
+    run = setup()
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"time" : min(times),"peak_memory" : peak}
+
+def compare(results,baseline,tolerance):
+    '''Function to display the results and the ratios to the baseline, returns the names of the regressions'''
+
+    regressions = []
+
+    print("{:<40}{:>12}{:>14}{:>10}{:>10}".format("benchmark","time (ms)","peak (KiB)","time x","peak x"))
+
+    for name,result in results.items():
+        line = "{:<40}{:>12.3f}{:>14.1f}".format(name,result["time"] * 1000,result["peak_memory"] / 1024)
+
+        if(name in baseline):
+            time_ratio = result["time"] / baseline[name]["time"] if baseline[name]["time"] > 0 else 1
+            peak_ratio = result["peak_memory"] / baseline[name]["peak_memory"] if baseline[name]["peak_memory"] > 0 else 1
+            line += "{:>10.2f}{:>10.2f}".format(time_ratio,peak_ratio)
+
+            if(time_ratio > 1 + tolerance or peak_ratio > 1 + tolerance):
+                regressions.append(name)
+                line += "  REGRESSION"
+
+        print(line)
+
+    return regressions
+
+def main(argv = None):
+    '''Run the benchmark suite and compare it to the baseline'''
+
+    parser = argparse.ArgumentParser(description = "Benchmark suite of the grid construction, evaluation and genetic algorithm")
+    parser.add_argument("--baseline",default = "benchmark_baseline.json",help = "baseline JSON file")
+    parser.add_argument("--save",action = "store_true",help = "store the results as the new baseline")
+    parser.add_argument("--repeat",type = int,default = 3,help = "number of measured executions of each benchmark")
+    parser.add_argument("--tolerance",type = float,default = 0.25,help = "accepted relative slowdown before a regression")
+    parser.add_argument("--only",default = "",help = "only run the benchmarks containing this string")
+    args = parser.parse_args(argv)
+
+    baseline = dict()
+    if(os.path.exists(args.baseline)):
+        with open(args.baseline,"r") as file:
+            baseline = json.load(file)
+
+    #Evaluation modes giving the cost of the sentence mode
+    failures = consistency_checks()
+    for failure in failures:
+        print("CHECK FAILED : "+failure)
+
+    results = dict()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+
+        #Synthetic corpora and grid
+        for nb_words in VOCABULARY_SIZES:
+            words = zipf_corpus(os.path.join(data_dir,"synthetic_"+str(nb_words)+".txt"),nb_words,nb_words * 20,seed = SEED)
+
+            if(nb_words == RANDOM_GRID_SIZE):
+                random_grid(os.path.join(data_dir,"grid_"+str(nb_words)+".csv"),words,max_depth = 4,seed = SEED)
+
+        for name,setup in benchmarks(data_dir):
+            if(args.only in name):
+                results.update({name : measure(setup,args.repeat)})
+
+    regressions = compare(results,baseline,args.tolerance)
+
+    if(args.save):
+        baseline.update(results)
+        with open(args.baseline,"w") as file:
+            json.dump(baseline,file,indent = 2,sort_keys = True)
+
+    return 1 if regressions or failures else 0
+
+
+if(__name__ == "__main__"):
+    sys.exit(main())
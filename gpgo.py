@@ -1,14 +1,25 @@
 import random
-from PictogramGrid import Grid
+from PictogramGrid import Grid,CompactGrid
 from EvaluationGrid import *
 from utils import *
 
 from os.path import exists
 from tqdm import tqdm
 import yaml
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from contextlib import contextmanager,nullcontext
+import os
+import pickle
+import cProfile
+import pstats
 
 #Paralellization
 import multiprocessing as mp
+import multiprocessing.pool
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 #DEAP Framework (Genetic Algorithm)
 from deap import base
@@ -20,6 +31,203 @@ from deap import tools
 #import fasttext.util
 
 
+#Evaluation data of the current worker process (set by init_evaluation_worker, only used by the process pools)
+worker_context = dict()
+
+def init_creator():
+  '''Function to create the DEAP fitness and individual types (if they do not exist yet)'''
+
+  if(not hasattr(creator,"FitnessMin")):
+    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+
+  if(not hasattr(creator,"Individual")):
+    creator.create("Individual", Grid, fitness=creator.FitnessMin)
+
+def init_evaluation_worker(evaluation_corpus,sim_matrix,similarity_coefficient,evaluation_mode):
+  '''Initializer of the evaluation workers, the evaluation data is received once by each worker'''
+
+  init_creator()
+
+  worker_context.update({"evaluation_corpus" : evaluation_corpus,"sim_matrix" : sim_matrix,
+                         "similarity_coefficient" : similarity_coefficient,"evaluation_mode" : evaluation_mode})
+
+def evaluate_with(context,individual):
+  '''Function to evaluate one individual with the evaluation data of an optimizer
+
+  :param context: evaluation data (evaluation corpus, similarity matrix, similarity coefficient and evaluation mode)
+  :type context: dict
+  :param individual: The inidividual to evaluate
+  :type individual: individual
+  :return: returns the production cost of the grid
+  :rtype: (float,)
+  '''
+
+  return grid_cost(individual, context["evaluation_corpus"],sim_matrix = context["sim_matrix"],
+                   similarity_coefficient=context["similarity_coefficient"],mode = context["evaluation_mode"]),
+
+def evaluate_individual(individual):
+  '''Function used by the worker processes to evaluate one individual with the data of init_evaluation_worker
+
+  :param individual: The inidividual to evaluate
+  :type individual: individual
+  :return: returns the production cost of the grid
+  :rtype: (float,)
+  '''
+
+  return evaluate_with(worker_context,individual)
+
+def process_executor(executor):
+  '''Function telling if the workers of an executor are processes (initialized by init_evaluation_worker)'''
+
+  if(isinstance(executor,mp.pool.ThreadPool)):
+    return False
+
+  return isinstance(executor,(mp.pool.Pool,ProcessPoolExecutor))
+
+def clone_individual(individual):
+  '''Function used by the toolbox to clone an individual through its compact representation (cheaper than a deepcopy of the grid).
+  The fitness, the incremental evaluation state, the modified words and the layout digests of the pages are copied with the grid.
+
+  :param individual: The individual to clone
+  :type individual: individual
+  :return: returns the copy of the individual
+  :rtype: individual
+  '''
+
+  new_ind = CompactGrid(individual).to_grid(type(individual))
+  new_ind.fitness = deepcopy(individual.fitness)
+
+  #Transition costs of the incremental evaluation (updated in place by the next evaluation)
+  if(individual.distance_state != None):
+    key,coefs,transition_costs = individual.distance_state
+    new_ind.distance_state = (key,coefs,transition_costs[:])
+
+  for name,page in individual.pages.items():
+    new_page = new_ind.pages[name]
+    new_page.layout_digest = page.layout_digest
+
+    if(page.modified_words != None):
+      new_page.modified_words = set(page.modified_words)
+
+  return new_ind
+
+class PhaseStats():
+    '''Timing statistics of the phases of the genetic algorithm (initialization, selection, clone, crossover, mutation, evaluation) :
+    wall time and number of calls of each phase, for each generation and in total.
+
+    :generations: statistics of each generation, {generation index : {phase : [time (seconds), calls]}}
+    :type generations: dict
+    :totals: statistics of the whole optimization (or of the merged optimizations), {phase : [time (seconds), calls]}
+    :type totals: dict
+    :nb_evaluations: number of grids evaluated (without the fitness cache hits)
+    :type nb_evaluations: integer
+    :cache_hits: number of individuals whose fitness was found in the fitness cache (or shared with an identical individual)
+    :type cache_hits: integer
+    :cache_misses: number of individuals evaluated through the fitness cache
+    :type cache_misses: integer
+    '''
+
+    PHASES = ("initialization","selection","clone","crossover","mutation","evaluation")
+
+    def __init__(self):
+      '''Constructor'''
+
+      self.generations = dict()
+      self.totals = {phase : [0.0,0] for phase in self.PHASES}
+      self.nb_evaluations = 0
+      self.cache_hits = 0
+      self.cache_misses = 0
+      self.nb_runs = 1
+
+      self.current = None
+
+    def start_generation(self,gen):
+      '''Method to start the statistics of a new generation'''
+
+      self.current = {phase : [0.0,0] for phase in self.PHASES}
+      self.generations.update({gen : self.current})
+
+    @contextmanager
+    def phase(self,name,calls = 1):
+      '''Context manager measuring the wall time of a phase of the current generation
+
+      :param name: name of the phase
+      :type name: string
+      :param calls: number of calls of the phase (clones, evaluations) in the measured block, optional (1 by default)
+      :type calls: integer
+      '''
+
+      start = time.perf_counter()
+      try:
+        yield
+      finally:
+        elapsed = time.perf_counter() - start
+
+        self.current[name][0] += elapsed
+        self.current[name][1] += calls
+        self.totals[name][0] += elapsed
+        self.totals[name][1] += calls
+
+    def nb_clones(self):
+      '''Number of cloned individuals'''
+
+      return self.totals["clone"][1]
+
+    def evaluations_per_second(self):
+      '''Number of grids evaluated per second of evaluation'''
+
+      if(self.totals["evaluation"][0] == 0):
+        return 0
+
+      return self.nb_evaluations / self.totals["evaluation"][0]
+
+    def cache_hit_rate(self):
+      '''Rate of the individuals whose fitness was found in the fitness cache'''
+
+      if(self.cache_hits + self.cache_misses == 0):
+        return 0
+
+      return self.cache_hits / (self.cache_hits + self.cache_misses)
+
+    def merge(self,other):
+      '''Method to add the totals of the statistics of another optimization (other process), the generations are not merged'''
+
+      for phase,(elapsed,calls) in other.totals.items():
+        self.totals[phase][0] += elapsed
+        self.totals[phase][1] += calls
+
+      self.nb_evaluations += other.nb_evaluations
+      self.cache_hits += other.cache_hits
+      self.cache_misses += other.cache_misses
+      self.nb_runs += other.nb_runs
+
+    def summary(self):
+      '''Method to get the totals as a dictionary (time, calls and share of the total time of each phase)'''
+
+      total_time = sum(elapsed for elapsed,_ in self.totals.values())
+
+      phases = dict()
+      for phase,(elapsed,calls) in self.totals.items():
+        phases.update({phase : {"time" : elapsed,"calls" : calls,"share" : elapsed / total_time if total_time > 0 else 0}})
+
+      return {"runs" : self.nb_runs,"time" : total_time,"phases" : phases,"clones" : self.nb_clones(),
+              "evaluations" : self.nb_evaluations,"evaluations_per_second" : self.evaluations_per_second(),
+              "cache_hits" : self.cache_hits,"cache_misses" : self.cache_misses,"cache_hit_rate" : self.cache_hit_rate()}
+
+    def display(self):
+      '''Method to display the totals of the phases'''
+
+      summary = self.summary()
+
+      print("## Phases of the genetic algorithm ("+str(summary["runs"])+" run(s)) ##")
+      for phase,values in summary["phases"].items():
+        print("  {:<15}{:>10.3f} s{:>7.1f} %{:>10} calls".format(phase.upper(),values["time"],values["share"] * 100,values["calls"]))
+      print("  CLONES : "+str(summary["clones"])+"     EVALUATIONS : "+str(summary["evaluations"])+
+            "     EVALUATIONS/S : "+str(round(summary["evaluations_per_second"],1)))
+      print("  CACHE HITS : "+str(summary["cache_hits"])+"     CACHE MISSES : "+str(summary["cache_misses"])+
+            "     HIT RATE : "+str(round(summary["cache_hit_rate"] * 100,1))+"%")
+
+
 class gpgo():
     '''Object that will compute an optimized grid from an initial grid using 
        an Evolutionary Algorithm (Genetic Algorithm) for a Pictogram Grid Communication System (PGCS)
@@ -46,11 +254,50 @@ class gpgo():
     :type similarity_coefficient: float ([0,1])
     :sim_model: Language model to compute the similarity between words (Word2Vec, Glove, ...)
     :type sim_model: model
+    :evaluation_mode: evaluation of the distance cost, "sentence", "bigram" (weighted distinct transitions), "compiled" (vectorized)
+                      or "incremental" (only the transitions of the modified words), optional ("compiled" by default)
+    :type evaluation_mode: string
+    :evaluation_corpus: preloaded evaluation corpus (shared between optimizers), optional (loaded from evaluation_files by default)
+    :type evaluation_corpus: class: EvaluationCorpus
+    :executor: object providing the map used to evaluate the individuals (process pool, thread pool, distributed map), optional (builtin map by default)
+    :type executor: executor
+    :init_mode: initialization of the population, "random" (randomizer) or "frequency" (grid seeded with the most frequent words of
+                the evaluation corpus in the first pages and slots, and perturbed variants of this seed), optional ("random" by default)
+    :type init_mode: string
+    :seed_perturbation: rate of words moved in the variants of the seed (frequency initialization), optional (0.1 by default)
+    :type seed_perturbation: float ([0,1])
+    :patience: number of generations without improvement of the best fitness before stopping, optional (0 by default, no limit)
+    :type patience: integer
+    :min_improvement: relative decrease of the best fitness counted as an improvement (patience), optional (0 by default, any decrease)
+    :type min_improvement: float
+    :time_budget: wall-clock time (seconds) after which the optimization stops, optional (0 by default, no limit)
+    :type time_budget: float
+    :evaluation_budget: number of evaluations after which the optimization stops, optional (0 by default, no limit)
+    :type evaluation_budget: integer
+    :checkpoint_file: file (pickle) where the state of the optimization is saved, optional (None by default, no checkpoint)
+    :type checkpoint_file: string
+    :checkpoint_generations: number of generations between two checkpoints, optional (0 by default, not used)
+    :type checkpoint_generations: integer
+    :checkpoint_seconds: time (seconds) between two checkpoints, optional (0 by default, not used)
+    :type checkpoint_seconds: float
+    :resume_from: checkpoint file from which the optimization continues, optional (None by default, new optimization)
+    :type resume_from: string
+    :fitness_cache_size: number of fitnesses kept in the cache of the grid fingerprints (least recently used removed), optional (10000 by default, 0 : no cache).
+                         The hits and misses of the last optimization are counted in cache_hits and cache_misses (and in phase_stats)
+    :type fitness_cache_size: integer
+    :instrumentation: if True, the wall time and the calls of each phase of the genetic algorithm are recorded in phase_stats, optional (False by default)
+    :type instrumentation: boolean
+    :profile: file where the statistics of the profiler (cProfile) of the genetic algorithm are written, optional (None by default, no profiling)
+    :type profile: string
     '''
     
     def __init__(self, source_files, evaluation_files, pop_size = 10, cross_proba = 0.5, cross_info_rate = 0.5,
                  mutation_proba = 0.5, select_number = 2, gen_number = 10, randomizer = True, page_row_size = 5, 
-                 page_col_size = 5, similarity_coefficient = 0.5, sim_model_path = None, sim_matrix_path = "sim_default.json"):
+                 page_col_size = 5, similarity_coefficient = 0.5, sim_model_path = None, sim_matrix_path = "sim_default.json",
+                 evaluation_mode = "compiled", evaluation_corpus = None, executor = None, init_mode = "random", seed_perturbation = 0.1,
+                 patience = 0, min_improvement = 0, time_budget = 0, evaluation_budget = 0,
+                 checkpoint_file = None, checkpoint_generations = 0, checkpoint_seconds = 0, resume_from = None,
+                 fitness_cache_size = 10000, instrumentation = False, profile = None):
                  
         '''Constructor
         '''
@@ -65,6 +312,14 @@ class gpgo():
         else:
             raise Exception("Not accepted evaluation file format !")
 
+        self.evaluation_mode = evaluation_mode
+
+        #Evaluation corpus loaded once for the whole optimization
+        if(evaluation_corpus == None):
+            self.evaluation_corpus = EvaluationCorpus(self.evaluation_files)
+        else:
+            self.evaluation_corpus = evaluation_corpus
+
         self.pop_size = pop_size
 
         #Check the cross probability is between 0 and 1
@@ -89,6 +344,16 @@ class gpgo():
 
         self.randomizer = randomizer
 
+        #Check the initialization mode of the population
+        if(init_mode not in ("random","frequency")):
+            raise Exception("Unexpected initialization mode (not 'random' or 'frequency') !")
+        self.init_mode = init_mode
+
+        #Check the seed perturbation rate is between 0 and 1
+        if(seed_perturbation < 0 or seed_perturbation > 1):
+            raise Exception("Unexpected seed perturbation rate (not between 0 and 1) !")
+        self.seed_perturbation = seed_perturbation
+
         self.page_row = page_row_size
         self.page_col = page_col_size
 
@@ -101,10 +366,49 @@ class gpgo():
         else:
           self.similarity_coefficient = similarity_coefficient
 
+        #Stop criteria (0 : criterion not used)
+        if(patience < 0 or min_improvement < 0 or time_budget < 0 or evaluation_budget < 0):
+            raise Exception("Unexpected stop criterion (negative value) !")
+
+        self.patience = patience
+        self.min_improvement = min_improvement
+        self.time_budget = time_budget
+        self.evaluation_budget = evaluation_budget
+
         self.fitness_log = dict()
 
         self.best_history = []
 
+        #Timing statistics of the phases of the last optimization (None without instrumentation)
+        self.instrumentation = instrumentation
+        self.phase_stats = None
+
+        #Statistics file of the profiler
+        self.profile = profile
+
+        #Reason of the end of the last optimization and number of evaluations
+        self.stop_reason = None
+        self.nb_evaluations = 0
+
+        #Best fitness of reference and number of generations without improvement (patience)
+        self.reference_fitness = math.inf
+        self.stall_generations = 0
+
+        #Checkpoints of the optimization
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_generations = checkpoint_generations
+        self.checkpoint_seconds = checkpoint_seconds
+        self.resume_from = resume_from
+
+        #Fitness of the last evaluated grids by fingerprint (LRU) and hit/miss counters of the last optimization
+        self.fitness_cache_size = fitness_cache_size
+        self.fitness_cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        #Function called at the end of each generation with (generation index, population), the population can be modified in place (migration)
+        self.generation_hook = None
+
         #Genetic objects initialization
         self.toolbox = base.Toolbox()
         self.init_genetic_objects()
@@ -125,13 +429,74 @@ class gpgo():
             #Load similarity model
             self.sim_model = fasttext.load_model(self.sim_model_path)
 
-            #Compute the similarity matrix
-            self.sim_matrix = compute_word_similarities(tmp_voc,self.sim_model)
-            store_similarity_matrix(self.sim_matrix,output_file = self.sim_matrix_path)
+            #Compute the similarity matrix and store it
+            self.sim_matrix = compute_word_similarities(tmp_voc,self.sim_model,output_file = self.sim_matrix_path)
             
           else:
             self.sim_matrix = load_similarity_matrix(self.sim_matrix_path)
 
+        #Similarity evaluator (page costs cached by set of words)
+        self.sim_evaluator = None
+        if(self.sim_matrix != None):
+          self.sim_evaluator = SimilarityEvaluator(self.sim_matrix)
+
+        #Map used for the evaluation
+        self.set_executor(executor)
+
+    def worker_initargs(self):
+      '''Method returning the arguments of init_evaluation_worker, to initialize the workers of an executor with the evaluation data'''
+
+      return (self.evaluation_corpus,self.sim_evaluator,self.similarity_coefficient,self.evaluation_mode)
+
+    def set_executor(self,executor):
+      '''Method to register the map used to evaluate the individuals.
+      With a process pool, the individuals are evaluated by evaluate_individual from the data given once to the workers
+      by init_evaluation_worker (initializer of the process pools), so the optimizer is not sent with each task.
+      The incremental evaluation state is not sent back by the worker processes.
+      With the other executors (thread pools, local or distributed maps), the evaluation data of this optimizer is bound
+      to the evaluation function, so several optimizers can share the same executor.
+
+      :param executor: object providing a map method (process pool, thread pool, distributed map) or None for the builtin map
+      :type executor: executor
+      '''
+
+      self.executor = executor
+
+      if(executor == None):
+        self.toolbox.register("map",map)
+        self.toolbox.register("evaluation",self.production_cost)
+
+      #Worker processes initialized with the data of this optimizer (init_evaluation_worker)
+      elif(process_executor(executor)):
+        self.toolbox.register("map",executor.map)
+        self.toolbox.register("evaluation",evaluate_individual)
+
+      #Threads, local and distributed maps : evaluation data of this optimizer only
+      else:
+        evaluation_corpus,sim_matrix,similarity_coefficient,evaluation_mode = self.worker_initargs()
+        context = {"evaluation_corpus" : evaluation_corpus,"sim_matrix" : sim_matrix,
+                   "similarity_coefficient" : similarity_coefficient,"evaluation_mode" : evaluation_mode}
+
+        self.toolbox.register("map",executor.map)
+        self.toolbox.register("evaluation",partial(evaluate_with,context))
+
+    def evaluation_pool(self,nb_workers = 0):
+      '''Method to create a process pool whose workers receive the evaluation data once, and to use it as executor
+
+      :param nb_workers: number of processes, optional (number of CPU cores by default)
+      :type nb_workers: integer
+      :return: returns the pool (to close once the optimization is done)
+      :rtype: multiprocessing.Pool
+      '''
+
+      if(nb_workers <= 0):
+        nb_workers = mp.cpu_count()
+
+      pool = mp.Pool(nb_workers,initializer = init_evaluation_worker,initargs = self.worker_initargs())
+      self.set_executor(pool)
+
+      return pool
+
     def fitness_history_record(self,fitnesses,gen_idx):
       '''Update the fitness history with a new fitness record and the corresponding generation as key
       
@@ -152,19 +517,230 @@ class gpgo():
 
       self.best_history.append(fitness)
 
-    def init_individual(self,container,source_files):
+    def evaluate_population(self,individuals):
+      '''Method to evaluate individuals with the map of the optimizer. The individuals whose fingerprint is in the fitness cache
+      (identical grids) are not evaluated again, and identical individuals are evaluated once.
+
+      :param individuals: individuals to evaluate
+      :type individuals: list
+      :return: returns the fitness of each individual
+      :rtype: list
+      '''
+
+      if(self.fitness_cache_size <= 0):
+        self.nb_evaluations += len(individuals)
+        return list(self.toolbox.map(self.toolbox.evaluation,individuals))
+
+      fitnesses = [None] * len(individuals)
+
+      #Individuals to evaluate by fingerprint
+      missing = dict()
+
+      for i,ind in enumerate(individuals):
+        key = ind.fingerprint()
+
+        if(key in self.fitness_cache):
+          self.fitness_cache.move_to_end(key)
+          fitnesses[i] = self.fitness_cache[key]
+          self.cache_hits += 1
+
+        elif(key in missing):
+          missing[key].append(i)
+          self.cache_hits += 1
+
+        else:
+          missing.update({key : [i]})
+          self.cache_misses += 1
+
+      #Evaluation of one individual for each fingerprint
+      evaluated = list(self.toolbox.map(self.toolbox.evaluation,[individuals[idxs[0]] for idxs in missing.values()]))
+      self.nb_evaluations += len(evaluated)
+
+      for (key,idxs),fit in zip(missing.items(),evaluated):
+        for i in idxs:
+          fitnesses[i] = fit
+
+        self.fitness_cache.update({key : fit})
+
+        if(len(self.fitness_cache) > self.fitness_cache_size):
+          self.fitness_cache.popitem(last = False)
+
+      return fitnesses
+
+    def measure_phase(self,name,calls = 1):
+      '''Method returning the context manager measuring a phase of the genetic algorithm (nothing is measured without instrumentation)'''
+
+      if(self.phase_stats == None):
+        return nullcontext()
+
+      return self.phase_stats.phase(name,calls)
+
+    def stop_criterion(self,start_time):
+      '''Method to check the stop criteria at the end of a generation (patience, time budget and evaluation budget)
+
+      :param start_time: time of the beginning of the optimization (time.perf_counter)
+      :type start_time: float
+      :return: returns the reason of the stop or None to continue
+      :rtype: string
+      '''
+
+      #Improvement of the best fitness since the last reference
+      best_fitness = self.best_history[-1]
+      if(self.reference_fitness - best_fitness > self.min_improvement * abs(self.reference_fitness)):
+        self.reference_fitness = best_fitness
+        self.stall_generations = 0
+      else:
+        self.stall_generations += 1
+
+      if(self.patience > 0 and self.stall_generations >= self.patience):
+        return "patience"
+
+      if(self.time_budget > 0 and time.perf_counter() - start_time >= self.time_budget):
+        return "time_budget"
+
+      if(self.evaluation_budget > 0 and self.nb_evaluations >= self.evaluation_budget):
+        return "evaluation_budget"
+
+      return None
+
+    def save_checkpoint(self,pop,best_ind,best_gen,gen,elapsed):
+      '''Method to save the state of the optimization at the end of a generation in the checkpoint file.
+      The individuals are stored as compact grids with their fitness. The file is replaced atomically,
+      so an interrupted writing keeps the previous checkpoint.
+
+      :param pop: population of the generation
+      :type pop: list
+      :param best_ind: best individual found
+      :type best_ind: individual
+      :param best_gen: generation of the best individual
+      :type best_gen: integer
+      :param gen: generation index
+      :type gen: integer
+      :param elapsed: time (seconds) spent in the optimization
+      :type elapsed: float
+      '''
+
+      state = {"generation" : gen,
+               "population" : [(CompactGrid(ind),ind.fitness.values) for ind in pop],
+               "best" : (CompactGrid(best_ind),best_ind.fitness.values),
+               "best_generation" : best_gen,
+               "random_state" : random.getstate(),
+               "fitness_log" : self.fitness_log,
+               "best_history" : self.best_history,
+               "nb_evaluations" : self.nb_evaluations,
+               "reference_fitness" : self.reference_fitness,
+               "stall_generations" : self.stall_generations,
+               "fitness_cache" : self.fitness_cache,
+               "cache_counts" : (self.cache_hits,self.cache_misses),
+               "phase_stats" : self.phase_stats,
+               "elapsed" : elapsed}
+
+      tmp_file = self.checkpoint_file + ".tmp"
+
+      with open(tmp_file,"wb") as file:
+        pickle.dump(state,file,protocol = pickle.HIGHEST_PROTOCOL)
+
+      os.replace(tmp_file,self.checkpoint_file)
+
+    def restore_checkpoint(self,checkpoint_file):
+      '''Method to restore the state of the optimization from a checkpoint file
+
+      :param checkpoint_file: checkpoint file (save_checkpoint)
+      :type checkpoint_file: string
+      :return: returns the population, the best individual, its generation, the generation of the checkpoint and the time spent
+      :rtype: list,individual,integer,integer,float
+      '''
+
+      with open(checkpoint_file,"rb") as file:
+        state = pickle.load(file)
+
+      #Individuals rebuilt from the compact grids
+      pop = []
+      for compact,values in state["population"]:
+        ind = compact.to_grid(creator.Individual)
+        ind.fitness.values = values
+        pop.append(ind)
+
+      best_ind = state["best"][0].to_grid(creator.Individual)
+      best_ind.fitness.values = state["best"][1]
+
+      random.setstate(state["random_state"])
+
+      self.fitness_log = state["fitness_log"]
+      self.best_history = state["best_history"]
+      self.nb_evaluations = state["nb_evaluations"]
+      self.reference_fitness = state["reference_fitness"]
+      self.stall_generations = state["stall_generations"]
+      self.fitness_cache = state["fitness_cache"]
+      self.cache_hits,self.cache_misses = state["cache_counts"]
+      if(self.instrumentation and state["phase_stats"] != None):
+        self.phase_stats = state["phase_stats"]
+
+      return pop,best_ind,state["best_generation"],state["generation"],state["elapsed"]
+
+    def init_individual(self,container,source_files,vocabulary = None):
       '''Method to initialize one individual (Grid) for the Optimizer
       
       :param container: Encapsulation structure for the Grid.
       :type container: container
       :param source_files: Vocabulary or file from which the grid will be generated.
       :type source_files: file or Dict
+      :param vocabulary: ordered vocabulary placed in the grid (not random), optional (None by default)
+      :type vocabulary: list
       :return: returns a container
       :rtype container: container
       '''
       #Create an encapsulated grid in the container to fit with the DEAP framework (from the source file)
-      return container(source_files,root_name = "accueil",randomizer = self.randomizer,warnings = False,
-                       page_row_size = self.page_row,page_col_size = self.page_col)
+      if(vocabulary == None):
+        return container(source_files,root_name = "accueil",randomizer = self.randomizer,warnings = False,
+                         page_row_size = self.page_row,page_col_size = self.page_col)
+
+      #Grid following the given order of the vocabulary
+      return container(source_files,root_name = "accueil",randomizer = False,warnings = False,
+                       page_row_size = self.page_row,page_col_size = self.page_col,vocabulary = vocabulary)
+
+    def word_frequencies(self):
+      '''Method to get the number of occurrences of each word of the evaluation corpus'''
+
+      words = self.evaluation_corpus.words
+      return {words[word_id] : count for word_id,count in self.evaluation_corpus.word_counts().items()}
+
+    def seed_vocabulary(self,source_files,frequencies):
+      '''Method to get the vocabulary of the source files sorted by frequency in the evaluation corpus (most frequent first).
+      The pages are filled in breadth-first order, so the most frequent words are placed in the pages closest to the root.
+
+      :param source_files: file from which the grid will be generated.
+      :type source_files: file
+      :param frequencies: number of occurrences of each word of the evaluation corpus
+      :type frequencies: dict
+      :return: returns the sorted vocabulary
+      :rtype: list
+      '''
+
+      voc = get_vocabulary_from_corpus(source_files)
+      voc.sort(key = lambda word : -frequencies.get(word,0))
+
+      return voc
+
+    def perturbed_vocabulary(self,voc):
+      '''Method to get a variant of a seed vocabulary, some words are swapped with a word at most one page further or closer
+
+      :param voc: seed vocabulary
+      :type voc: list
+      :return: returns a new vocabulary
+      :rtype: list
+      '''
+
+      voc = list(voc)
+      window = self.page_row * self.page_col
+
+      for i in range(int(self.seed_perturbation * len(voc))):
+        idx_a = random.randint(0,len(voc) - 1)
+        idx_b = min(max(idx_a + random.randint(-window,window),0),len(voc) - 1)
+
+        voc[idx_a],voc[idx_b] = voc[idx_b],voc[idx_a]
+
+      return voc
 
     def init_population(self,container,func,source_files):
       '''Method to initialize the population of the Optimizer
@@ -178,7 +754,25 @@ class gpgo():
       '''
 
       #Create a population of individuals. The size of the population is the initial population size. 
-      return container(func(source_files) for i in range(self.pop_size))
+      if(self.init_mode == "random"):
+        return container(func(source_files) for i in range(self.pop_size))
+
+      #Seed grid (frequency order) and perturbed variants of the seed
+      frequencies = self.word_frequencies()
+      seed = self.seed_vocabulary(source_files,frequencies)
+
+      pop = container()
+      for i in range(self.pop_size):
+        if(i == 0):
+          ind = func(source_files,seed)
+        else:
+          ind = func(source_files,self.perturbed_vocabulary(seed))
+
+        #Most frequent words of each page in the slots closest to the cell (0,0)
+        ind.sort_pages(frequencies)
+        pop.append(ind)
+
+      return pop
 
 
     def init_genetic_objects(self):
@@ -186,8 +780,7 @@ class gpgo():
       '''
 
       #Creator for the fitness and the individual types
-      creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
-      creator.create("Individual", Grid, fitness=creator.FitnessMin)
+      init_creator()
         
       #Individual definition
       self.toolbox.register("individual", self.init_individual, creator.Individual)
@@ -203,7 +796,8 @@ class gpgo():
       :return: returns the production cost of the grid
       :rtype: (float,)
       '''
-      return grid_cost(individual, self.evaluation_files,sim_matrix = self.sim_matrix, similarity_coefficient=self.similarity_coefficient),
+      return grid_cost(individual, self.evaluation_corpus,sim_matrix = self.sim_evaluator, similarity_coefficient=self.similarity_coefficient,
+                       mode = self.evaluation_mode),
 
     def crossover_picto_inter(self,ind_x, ind_y):
       '''Method used by the optimizer to perform a crossover between two individuals and generate a new one
@@ -229,13 +823,11 @@ class gpgo():
           picto_target_x = ind_x.pages[page_name_x].pictograms[picto_y.word]
 
           #Find the pictogram having the same position of the previous one
-          picto_to_swap_x = None
-
-          for picto_x in ind_x.pages[page_y.name].pictograms.values():
+          picto_to_swap_x = ind_x.pages[page_y.name].pictogram_at(picto_y.row,picto_y.col)
 
-            if(picto_x.is_directory == False and picto_x.row == picto_y.row and picto_x.col == picto_y.col):
+          if(picto_to_swap_x != None and picto_to_swap_x.is_directory == True):
 
-              picto_to_swap_x = picto_x
+            picto_to_swap_x = None
 
           #Do not swap the same pictogram
           if(picto_to_swap_x and picto_target_x.word != picto_to_swap_x.word):
@@ -402,6 +994,10 @@ class gpgo():
 
       #--Evaluation definition--
       self.toolbox.register("evaluation", self.production_cost)
+      self.toolbox.register("map", map)
+
+      #--Clone definition (compact round trip instead of the deepcopy of DEAP)--
+      self.toolbox.register("clone", clone_individual)
 
       #--Selection definition--
 
@@ -417,6 +1013,7 @@ class gpgo():
 
     def genetic_algorithm(self,pid = 0):
       '''Method that will use a genetic algorithm to generate an optimal grid starting from a random generation.
+      With a profile file, the optimization is run under the profiler and its statistics are written in the file.
 
       :param pid: Process id
       :type: integer
@@ -424,48 +1021,96 @@ class gpgo():
       :rtype: class: Grid
       '''
 
+      if(self.profile == None):
+        return self.genetic_process(pid)
+
+      profiler = cProfile.Profile()
+      result = profiler.runcall(self.genetic_process,pid)
+      profiler.dump_stats(self.profile)
+
+      return result
+
+    def genetic_process(self,pid = 0):
+      '''Method running the genetic algorithm (see genetic_algorithm)'''
+
       #====INITIAL GENERATION====
 
-      #Initialization of the population
-      pop = self.toolbox.population(self.source_files)
+      self.stop_reason = "gen_number"
+      self.cache_hits = 0
+      self.cache_misses = 0
+
+      #Measure of the phases (continued from the checkpoint when resuming)
+      self.phase_stats = PhaseStats() if self.instrumentation else None
+      phase = self.measure_phase
+
+      #Continue the optimization from a checkpoint
+      if(self.resume_from != None):
+        pop,best_ind,best_gen,first_gen,elapsed = self.restore_checkpoint(self.resume_from)
+        start_time = time.perf_counter() - elapsed
+        first_gen += 1
+
+      else:
+        start_time = time.perf_counter()
+        self.nb_evaluations = 0
+        first_gen = 1
+
+        if(self.instrumentation):
+          self.phase_stats.start_generation(0)
 
-      #Initialization of the best individual
-      best_ind = pop[0]
-      best_gen = 0
+        #Initialization of the population
+        with phase("initialization",self.pop_size):
+          pop = self.toolbox.population(self.source_files)
 
-      #Evaluation of the initial population
+        #Initialization of the best individual
+        best_ind = pop[0]
+        best_gen = 0
 
-      fitnesses = list(map(self.toolbox.evaluation,pop))
-      min_init_fit = math.inf,
+        #Evaluation of the initial population
 
-      #Recording fitnesses
-      self.fitness_history_record(fitnesses,0)
+        with phase("evaluation",len(pop)):
+          fitnesses = self.evaluate_population(pop)
+        min_init_fit = math.inf,
 
-      #For each individual in the population, associate the fitness to the individual
-      for ind, fit in zip(pop, fitnesses):
-        ind.fitness.values = fit
+        #Recording fitnesses
+        self.fitness_history_record(fitnesses,0)
+
+        #For each individual in the population, associate the fitness to the individual
+        for ind, fit in zip(pop, fitnesses):
+          ind.fitness.values = fit
+
+          #Keep the best individual of the initial population
+          if(fit < min_init_fit):
+            min_init_fit = fit
+            best_ind = ind
+
+        #Record of the best fitness
+        self.fitness_best_record(best_ind.fitness.values[0])
 
-        #Keep the best individual of the initial population
-        if(fit < min_init_fit):
-          min_init_fit = fit
-          best_ind = ind
+        #Reference of the patience criterion
+        self.reference_fitness = best_ind.fitness.values[0]
+        self.stall_generations = 0
 
-      #Record of the best fitness
-      self.fitness_best_record(best_ind.fitness.values[0])
+        #print("DEBUG : INITIAL GENERATION (0) --> Best fitness : " + str(best_ind.fitness.values[0]) + "\n")
 
-      #print("DEBUG : INITIAL GENERATION (0) --> Best fitness : " + str(best_ind.fitness.values[0]) + "\n")
+      #Time of the last checkpoint
+      checkpoint_time = time.perf_counter()
 
       #==ITERATION OVER GENERATIONS==
 
       #Iterative process : For each generation
-      for gen in tqdm(range(1,self.gen_number+1),desc = "Process : "+str(pid),unit = "generation",position = pid):
+      for gen in tqdm(range(first_gen,self.gen_number+1),desc = "Process : "+str(pid),unit = "generation",position = pid):
+
+        if(self.instrumentation):
+          self.phase_stats.start_generation(gen)
 
         #--SELECTION--
 
         #Select the k best individuals of the current generation
-        offspring = self.toolbox.selection(pop,self.select_number)
+        with phase("selection"):
+          offspring = self.toolbox.selection(pop,self.select_number)
         # Clone the selected individuals
-        offspring = list(map(self.toolbox.clone, offspring))
+        with phase("clone",len(offspring)):
+          offspring = list(map(self.toolbox.clone, offspring))
 
         #--CROSSOVER--
         for ind1,ind2 in zip(offspring[::2], offspring[1::2]):
@@ -474,7 +1119,8 @@ class gpgo():
           if(random.random() < self.cross_proba):
             
             #Crossover operation to generate the new individual
-            new_ind1,new_ind2 = self.toolbox.crossover(ind2,ind1)
+            with phase("crossover"):
+              new_ind1,new_ind2 = self.toolbox.crossover(ind2,ind1)
             offspring.append(new_ind1)
             offspring.append(new_ind2)
 
@@ -486,9 +1132,11 @@ class gpgo():
 
             #Mutation operation to modify the individual
             offspring.remove(ind)
-            mutant = self.toolbox.mutation(ind)
+            with phase("mutation"):
+              mutant = self.toolbox.mutation(ind)
             del mutant.fitness.values
-            offspring.append(self.toolbox.clone(mutant))
+            with phase("clone"):
+              offspring.append(self.toolbox.clone(mutant))
 
         #--EVALUATION--
 
@@ -496,8 +1144,9 @@ class gpgo():
         invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
 
         #Evaluation of the population
-        fitnesses = list(map(self.toolbox.evaluation,invalid_ind))
-          
+        with phase("evaluation",len(invalid_ind)):
+          fitnesses = self.evaluate_population(invalid_ind)
+
         #Recording fitnesses
         self.fitness_history_record(fitnesses,gen)
 
@@ -508,6 +1157,10 @@ class gpgo():
         #--NEW GENERATION--
         pop[:] = offspring
 
+        #Exchange of individuals with other optimizers
+        if(self.generation_hook != None):
+          self.generation_hook(gen,pop)
+
         #Save the best individual of the population
         for ind in pop:
           if(ind.fitness.values < best_ind.fitness.values):
@@ -516,9 +1169,32 @@ class gpgo():
 
         #Record of the best fitness
         self.fitness_best_record(best_ind.fitness.values[0])
-        
-      #Final best grid
-      best_fitness = self.toolbox.evaluation(best_ind)[0]
+
+        #--STOP CRITERIA--
+        stop_reason = self.stop_criterion(start_time)
+
+        #--CHECKPOINT--
+        if(self.checkpoint_file != None):
+          if((self.checkpoint_generations > 0 and gen % self.checkpoint_generations == 0) or
+             (self.checkpoint_seconds > 0 and time.perf_counter() - checkpoint_time >= self.checkpoint_seconds)):
+            self.save_checkpoint(pop,best_ind,best_gen,gen,time.perf_counter() - start_time)
+            checkpoint_time = time.perf_counter()
+
+        if(stop_reason != None):
+          self.stop_reason = stop_reason
+          break
+
+      if(self.instrumentation):
+        self.phase_stats.nb_evaluations = self.nb_evaluations
+        self.phase_stats.cache_hits = self.cache_hits
+        self.phase_stats.cache_misses = self.cache_misses
+
+      #Final best grid (evaluated in this process)
+      best_fitness = self.production_cost(best_ind)[0]
+
+      #Similarity scores of the pictograms of the exported grid
+      if(self.sim_evaluator != None):
+        self.sim_evaluator.update_similarity_scores(best_ind)
       #print("DEBUG : Best individual --> Generation : " + str(best_gen) + ", Fitness : " + str(best_fitness))
       return best_ind,best_fitness
 
@@ -584,7 +1260,12 @@ class gpgo():
       params = {"pop_size" : self.pop_size,"select_number" : self.select_number,"gen_number" : self.gen_number,
                     "cross_proba" : self.cross_proba,"cross_info_rate" : self.cross_info_rate,"mutation_proba" : self.mutation_proba,
                     "page_row" : self.page_row,"page_col" : self.page_col,"randomizer" : self.randomizer,
-                    "similarity_coefficient" : self.similarity_coefficient,"sim_model_path" : self.sim_model_path,"sim_matrix_path" : self.sim_matrix_path}
+                    "similarity_coefficient" : self.similarity_coefficient,"sim_model_path" : self.sim_model_path,"sim_matrix_path" : self.sim_matrix_path,
+                    "evaluation_mode" : self.evaluation_mode,"init_mode" : self.init_mode,"seed_perturbation" : self.seed_perturbation,
+                    "patience" : self.patience,"min_improvement" : self.min_improvement,"time_budget" : self.time_budget,
+                    "evaluation_budget" : self.evaluation_budget,"checkpoint_generations" : self.checkpoint_generations,
+                    "checkpoint_seconds" : self.checkpoint_seconds,"fitness_cache_size" : self.fitness_cache_size,
+                    "instrumentation" : self.instrumentation}
 
       with open(config_file,'w') as file:
 
@@ -609,8 +1290,8 @@ class gpgo():
         print("========================================================================\n")
 
 
-def load_gpgo(source_files,evaluation_files,config_file):
-  '''Function to create a gpgo with a configuration file'''
+def load_gpgo(source_files,evaluation_files,config_file,evaluation_corpus = None,checkpoint_file = None,resume_from = None,profile = None):
+  '''Function to create a gpgo with a configuration file (the checkpoint and profile files are specific to the run)'''
 
   if(config_file.endswith('.yaml')):
         
@@ -622,8 +1303,78 @@ def load_gpgo(source_files,evaluation_files,config_file):
             
         return gpgo(source_files,evaluation_files,doc["pop_size"],doc["cross_proba"],doc["cross_info_rate"],
                     doc["mutation_proba"],doc["select_number"],doc["gen_number"],doc["randomizer"],doc["page_row"],
-                    doc["page_col"],doc["similarity_coefficient"],doc["sim_model_path"],doc["sim_matrix_path"])
+                    doc["page_col"],doc["similarity_coefficient"],doc["sim_model_path"],doc["sim_matrix_path"],
+                    evaluation_mode = doc.get("evaluation_mode","compiled"),evaluation_corpus = evaluation_corpus,
+                    init_mode = doc.get("init_mode","random"),seed_perturbation = doc.get("seed_perturbation",0.1),
+                    patience = doc.get("patience",0),min_improvement = doc.get("min_improvement",0),
+                    time_budget = doc.get("time_budget",0),evaluation_budget = doc.get("evaluation_budget",0),
+                    checkpoint_file = checkpoint_file,checkpoint_generations = doc.get("checkpoint_generations",0),
+                    checkpoint_seconds = doc.get("checkpoint_seconds",0),resume_from = resume_from,
+                    fitness_cache_size = doc.get("fitness_cache_size",10000),instrumentation = doc.get("instrumentation",False),
+                    profile = profile)
   else:
     raise Exception("Not accepted configuration file format ! (.yaml)")
 
-  
\ No newline at end of file
+
+#Functions watched in the profile reports (tree search and cloning of the grids)
+WATCHED_FUNCTIONS = ("find_node","path_finding","distance_finding","deepcopy","clone_individual","grid_cost","fingerprint")
+
+def merge_profiles(profile_files,output_file = None):
+  '''Function to merge the statistics files of the profiler (one file per process)
+
+  :param profile_files: statistics files (existing files only)
+  :type profile_files: list
+  :param output_file: file where the merged statistics are written, optional (None by default)
+  :type output_file: string
+  :return: returns the merged statistics (None if there is no file)
+  :rtype: pstats.Stats
+  '''
+
+  profile_files = [profile_file for profile_file in profile_files if exists(profile_file)]
+
+  if(not profile_files):
+    return None
+
+  stats = pstats.Stats(*profile_files)
+
+  if(output_file != None):
+    stats.dump_stats(output_file)
+
+  return stats
+
+def profile_report(stats,nb_functions = 20,watched = WATCHED_FUNCTIONS):
+  '''Function to display the hot functions of profiler statistics : the functions with the highest own time,
+  and the cumulative time of the watched functions (share of the total time)
+
+  :param stats: statistics of the profiler
+  :type stats: pstats.Stats
+  :param nb_functions: number of displayed functions, optional (20 by default)
+  :type nb_functions: integer
+  :param watched: names of the watched functions, optional (WATCHED_FUNCTIONS by default)
+  :type watched: tuple
+  '''
+
+  total_time = stats.total_tt
+
+  print("## Profile ("+str(round(total_time,3))+" s) ##")
+
+  #Functions with the highest own time
+  functions = sorted(stats.stats.items(),key = lambda item : item[1][2],reverse = True)
+
+  print("  {:>10}{:>10}{:>8}{:>12}  {}".format("own (s)","cum (s)","own %","calls","function"))
+  for (file_name,line,name),(_,calls,own_time,cumulative_time,_) in functions[:nb_functions]:
+    print("  {:>10.3f}{:>10.3f}{:>8.1f}{:>12}  {}".format(own_time,cumulative_time,own_time / total_time * 100 if total_time > 0 else 0,
+                                                        calls,name+" ("+os.path.basename(file_name)+":"+str(line)+")"))
+
+  #Watched functions (calls from outside the function, the recursive calls are not counted)
+  print("  -- watched functions --")
+  for watched_name in watched:
+    calls = 0
+    cumulative_time = 0
+    for (file_name,line,name),(nb_calls,_,_,cumulative,_) in stats.stats.items():
+      if(name == watched_name):
+        calls += nb_calls
+        cumulative_time += cumulative
+
+    print("  {:<20}{:>10.3f} s{:>8.1f} %{:>12} calls".format(watched_name,cumulative_time,
+                                                          cumulative_time / total_time * 100 if total_time > 0 else 0,calls))
@@ -1,9 +1,247 @@
-from gpgo import gpgo,load_gpgo
+from gpgo import gpgo,load_gpgo,init_creator,PhaseStats,merge_profiles,profile_report
+from EvaluationCorpus import EvaluationCorpus
+from PictogramGrid import CompactGrid
+from utils import get_vocabulary_frequencies,load_similarity_matrix
 from tqdm import tqdm
+from os.path import splitext,exists
+import queue
+import traceback
+import yaml
 
 #Paralellization
 import multiprocessing as mp
 
+#DEAP Framework (Genetic Algorithm)
+from deap import creator
+from deap import tools
+
+#===============================================
+# OPTIMIZATION PROCESSES
+#===============================================
+
+#Data of the current optimization process (set by init_optimization_worker)
+optimization_context = dict()
+
+def init_optimization_worker(source_files,evaluation_files,evaluation_corpus,lock,sim_matrix_paths = ()):
+    '''Initializer of the optimization processes, the corpus is received once by each process.
+    The vocabulary and the similarity matrices are loaded in the caches of the process (already filled if the process is forked),
+    so the optimizers of the successive tasks do not load them again.'''
+
+    if(lock != None):
+        tqdm.set_lock(lock)
+
+    optimization_context.update({"source_files" : source_files,"evaluation_files" : evaluation_files,
+                                 "evaluation_corpus" : evaluation_corpus})
+
+    get_vocabulary_frequencies(source_files)
+    for sim_matrix_path in sim_matrix_paths:
+        load_similarity_matrix(sim_matrix_path)
+
+def optimization_pipeline(task):
+    '''Function executing the genetic algorithm for one process from a small task
+    (process id, configuration file, checkpoint file, resume file, profile file).
+    The best grid is returned as a compact grid : (compact best grid, fitness, best history, stop reason, phase statistics,
+    (fitness cache hits, fitness cache misses)).
+    '''
+
+    pid,config_file,checkpoint_file,resume_from,profile = task
+
+    #New genetic optimizer
+    optimizer = load_gpgo(optimization_context["source_files"],optimization_context["evaluation_files"],config_file,
+                          optimization_context["evaluation_corpus"],checkpoint_file,resume_from,profile)
+
+    #Optimization and return the best grid
+    best_grid,best_fitness = optimizer.genetic_algorithm(pid)
+
+    return (CompactGrid(best_grid),best_fitness,optimizer.best_history,optimizer.stop_reason,optimizer.phase_stats,
+            (optimizer.cache_hits,optimizer.cache_misses))
+
+def config_similarity_matrices(config_files):
+    '''Function to get the similarity matrices (existing files) used by the configuration files'''
+
+    sim_matrix_paths = []
+
+    for config_file in config_files:
+        with open(config_file,'r') as file:
+            for doc in yaml.load_all(file, Loader=yaml.FullLoader):
+                if(doc["sim_model_path"] != None and doc["similarity_coefficient"] > 0 and exists(doc["sim_matrix_path"])):
+                    if(doc["sim_matrix_path"] not in sim_matrix_paths):
+                        sim_matrix_paths.append(doc["sim_matrix_path"])
+
+    return sim_matrix_paths
+
+
+class OptimizationPool():
+    '''Long-lived pool of optimization processes. The corpus, the vocabulary and the similarity matrices
+    are loaded once when the processes start, then the pool runs successive batches of configurations
+    (parameter sweeps) without starting new processes.
+
+    :param source_files: source files of the generated grids
+    :type source_files: list of files (`.txt`)
+    :param evaluation_files: evaluation files of the grids
+    :type evaluation_files: list of files (`.txt`)
+    :param nb_proc: number of processes, optional (number of CPU cores by default)
+    :type nb_proc: integer
+    :param config_files: configuration files whose similarity matrices are preloaded, optional (empty by default)
+    :type config_files: list of files (`.yaml`)
+    :param evaluation_corpus: preloaded evaluation corpus, optional (loaded from evaluation_files by default)
+    :type evaluation_corpus: class: EvaluationCorpus
+    '''
+
+    def __init__(self,source_files,evaluation_files,nb_proc = 0,config_files = (),evaluation_corpus = None):
+        '''Constructor'''
+
+        self.source_files = source_files
+        self.evaluation_files = evaluation_files
+
+        if(nb_proc <= 0):
+          self.nb_proc = mp.cpu_count()
+        else:
+          self.nb_proc = nb_proc
+
+        if(evaluation_corpus == None):
+          self.evaluation_corpus = EvaluationCorpus(self.evaluation_files)
+        else:
+          self.evaluation_corpus = evaluation_corpus
+
+        #Shared data loaded before the creation of the processes (copy-on-write with fork)
+        sim_matrix_paths = config_similarity_matrices(config_files)
+        init_optimization_worker(self.source_files,self.evaluation_files,self.evaluation_corpus,None,sim_matrix_paths)
+        init_creator()
+
+        # Windows support
+        mp.freeze_support()
+
+        self.pool = mp.Pool(self.nb_proc,initializer = init_optimization_worker,
+                            initargs = (self.source_files,self.evaluation_files,self.evaluation_corpus,mp.RLock(),sim_matrix_paths))
+
+    def run(self,tasks):
+      '''Method to run a batch of optimizations
+
+      :param tasks: tasks of the optimizations : (process id, configuration file, checkpoint file, resume file, profile file)
+      :type tasks: list
+      :return: returns the result of each task : (compact best grid, fitness, best history, stop reason, phase statistics, cache counts)
+      :rtype: list
+      '''
+
+      return list(self.pool.imap(func = optimization_pipeline,iterable = tasks))
+
+    def close(self):
+      '''Method to stop the processes of the pool'''
+
+      self.pool.close()
+      self.pool.join()
+
+    def __enter__(self):
+      return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+      self.close()
+
+#===============================================
+# ISLAND MODEL
+#===============================================
+
+
+class IslandMigration():
+    '''Generation hook of an island : every interval generations, the best individuals of the island are sent
+    to the neighbour islands, and the individuals received from the other islands replace the worst individuals
+    of the population when they are better. The migration is asynchronous (an island never waits for the others).
+
+    :param pid: id of the island
+    :type pid: integer
+    :param inboxes: queue of the received individuals of each island
+    :type inboxes: list of multiprocessing.Queue
+    :param neighbours: ids of the islands receiving the individuals of this island
+    :type neighbours: list
+    :param interval: number of generations between two migrations
+    :type interval: integer
+    :param size: number of individuals sent to each neighbour
+    :type size: integer
+    '''
+
+    def __init__(self,pid,inboxes,neighbours,interval,size):
+        '''Constructor'''
+
+        self.inbox = inboxes[pid]
+        self.outboxes = [inboxes[neighbour] for neighbour in neighbours]
+        self.interval = interval
+        self.size = size
+
+        #Number of individuals received and integrated in the population
+        self.nb_received = 0
+        self.nb_accepted = 0
+
+        #The individuals not received before the end of a neighbour do not block this island
+        for outbox in self.outboxes:
+            outbox.cancel_join_thread()
+
+    def __call__(self,gen,pop):
+        '''Migration at the end of a generation'''
+
+        if(gen % self.interval != 0):
+            return
+
+        #Emigration of the best individuals (compact grids with their fitness)
+        emigrants = [(CompactGrid(ind),ind.fitness.values) for ind in tools.selBest(pop,self.size)]
+
+        for outbox in self.outboxes:
+            outbox.put(emigrants)
+
+        #Immigration of the individuals received since the last migration
+        immigrants = []
+        while True:
+            try:
+                immigrants.extend(self.inbox.get_nowait())
+            except queue.Empty:
+                break
+
+        self.nb_received += len(immigrants)
+
+        #Best immigrants first, worst individuals of the population first
+        immigrants.sort(key = lambda immigrant : immigrant[1])
+        worst = sorted(range(len(pop)),key = lambda i : pop[i].fitness)
+
+        for (compact,values),idx in zip(immigrants,worst):
+            if(values < pop[idx].fitness.values):
+                ind = compact.to_grid(creator.Individual)
+                ind.fitness.values = values
+                pop[idx] = ind
+                self.nb_accepted += 1
+
+def island_pipeline(pid,source_files,evaluation_files,config_file,evaluation_corpus,inboxes,neighbours,interval,size,results,lock,profile = None):
+    '''Function executing the genetic algorithm of one island (process of mp_island_algorithm).
+    The result is sent to the results queue as (pid, compact best grid, fitness, best history, stop reason, phase statistics, cache counts,
+    migration counts).
+    If the optimization fails, (pid, traceback of the error) is sent instead, so the main process does not wait for the result.
+    '''
+
+    try:
+        tqdm.set_lock(lock)
+
+        #Optimizer of the island with the migration at the end of the generations
+        optimizer = load_gpgo(source_files,evaluation_files,config_file,evaluation_corpus,profile = profile)
+        optimizer.generation_hook = IslandMigration(pid,inboxes,neighbours,interval,size)
+
+        best_grid,best_fitness = optimizer.genetic_algorithm(pid)
+
+        migration = optimizer.generation_hook
+        results.put((pid,CompactGrid(best_grid),best_fitness,optimizer.best_history,optimizer.stop_reason,optimizer.phase_stats,
+                     (optimizer.cache_hits,optimizer.cache_misses),(migration.nb_received,migration.nb_accepted)))
+
+    except Exception:
+        results.put((pid,traceback.format_exc()))
+
+def stop_processes(processes):
+    '''Function to stop the processes still running and wait for their end'''
+
+    for process in processes:
+        if(process.is_alive()):
+            process.terminate()
+
+    for process in processes:
+        process.join()
+
 #===============================================
 # MULTIPROCESSING OF THE GENETIC ALGORITHM
 #===============================================
@@ -11,7 +249,8 @@ import multiprocessing as mp
 
 class mp_gpgo():
     
-    def __init__(self, source_files, evaluation_files, config_files, nb_proc = 0):
+    def __init__(self, source_files, evaluation_files, config_files, nb_proc = 0, checkpoint_file = None, resume_from = None, pool = None,
+                 profile = None):
 
         self.source_files = source_files
         
@@ -23,6 +262,17 @@ class mp_gpgo():
         else:
             raise Exception("Not accepted evaluation file format !")
 
+        #Long-lived pool of processes (OptimizationPool of the same corpus), a new pool is created for each run by default
+        self.pool = pool
+
+        #Evaluation corpus loaded once and shared by all the processes
+        if(pool != None):
+          if(pool.source_files != source_files or pool.evaluation_files != evaluation_files):
+            raise Exception("The pool was created for another corpus !")
+          self.evaluation_corpus = pool.evaluation_corpus
+        else:
+          self.evaluation_corpus = EvaluationCorpus(self.evaluation_files)
+
         self.config_files = config_files
 
         #Set the number of process
@@ -32,21 +282,38 @@ class mp_gpgo():
           self.nb_proc = nb_proc
 
         self.final_results = None
-        
-        #Load one optimizer to initialize the DEAP objects
-        init_deap = load_gpgo(self.source_files, self.evaluation_files, self.config_files[0])
 
-    def mp_optimization_pipeline(self,pid):
-      '''Function to execute the genetic_algorithm for one process
-      '''
+        #Checkpoint files of the processes (suffixed by the process id)
+        self.checkpoint_file = checkpoint_file
+        self.resume_from = resume_from
+
+        #Profile files of the processes (suffixed by the process id), merged in the profile file after the run
+        self.profile = profile
+        self.profile_stats = None
+
+        #Initialize the DEAP objects
+        init_creator()
+
+    def process_file(self,file_path,pid):
+      '''Method to get the checkpoint or profile file of one process (file_path suffixed by the process id)'''
 
-      #New genetic optimizer
-      optimizer = load_gpgo(self.source_files, self.evaluation_files, self.config_files[pid%len(self.config_files)])
+      if(file_path == None):
+        return None
 
-      #Optimization and return the best grid
-      optimal_grid = optimizer.genetic_algorithm(pid)
+      root,ext = splitext(file_path)
+      return root+"_"+str(pid)+ext
 
-      return optimal_grid[0],optimal_grid[1],optimizer.best_history
+    def optimization_tasks(self):
+      '''Method to get the task of each process : (process id, configuration file, checkpoint file, resume file, profile file)'''
+
+      tasks = []
+
+      for pid in range(self.nb_proc):
+        tasks.append((pid,self.config_files[pid%len(self.config_files)],
+                      self.process_file(self.checkpoint_file,pid),self.process_file(self.resume_from,pid),
+                      self.process_file(self.profile,pid)))
+
+      return tasks
 
     def mp_fitness_history(self):
         '''Method to get the best history from each processes'''
@@ -59,31 +326,84 @@ class mp_gpgo():
 
         return history
 
+    def mp_stop_reasons(self):
+        '''Method to get the reason of the end of the optimization of each processes'''
+
+        reasons = []
+
+        for result in self.final_results:
+
+            reasons.append(result[3])
+
+        return reasons
+
+    def mp_cache_counts(self):
+        '''Method to get the fitness cache hits and misses of each processes'''
+
+        counts = []
+
+        for result in self.final_results:
+
+            counts.append(result[5])
+
+        return counts
+
+    def merge_profiles(self):
+        '''Method to merge the profile files of the processes in the profile file'''
+
+        if(self.profile != None):
+            self.profile_stats = merge_profiles([self.process_file(self.profile,pid) for pid in range(self.nb_proc)],self.profile)
+
+    def mp_profile_report(self,nb_functions = 20):
+        '''Method to display the hot functions of the merged profile of the processes'''
+
+        if(self.profile_stats == None):
+            raise Exception("No profile of the processes (profile option) !")
+
+        profile_report(self.profile_stats,nb_functions)
+
+    def mp_phase_stats(self):
+        '''Method to get the phase statistics of the processes merged (None if the instrumentation is disabled in all the configurations)'''
+
+        stats = None
+
+        for result in self.final_results:
+
+            if(result[4] != None):
+                if(stats == None):
+                    stats = PhaseStats()
+                    stats.nb_runs = 0
+                stats.merge(result[4])
+
+        return stats
+
     def mp_genetic_algorithm(self):
       '''Function to run several times on several CPU cores the genetic algorithm
       '''
 
-      # Windows support
-      mp.freeze_support()
-
-      #Processes id
-      pids = []
-      for i in range(self.nb_proc):
-        pids.append(i)
-        
       #--MULTIPROCESSING--
 
-      #Pool creation
-      pool = mp.Pool(self.nb_proc,initargs=(mp.RLock(),), initializer=tqdm.set_lock)
+      #Pool creation (the corpus is sent once to each process)
+      if(self.pool == None):
+        pool = OptimizationPool(self.source_files,self.evaluation_files,self.nb_proc,self.config_files,self.evaluation_corpus)
+      else:
+        pool = self.pool
 
       #Pool starting
-      self.final_results = list(pool.imap(func = self.mp_optimization_pipeline,iterable = pids))
+      self.final_results = pool.run(self.optimization_tasks())
 
       #End of the pool
-      pool.close()
-      pool.join()
+      if(self.pool == None):
+        pool.close()
+
+      self.merge_profiles()
 
       #Return the best grid
+      return self.best_result()
+
+    def best_result(self):
+      '''Method to get the best grid of the results of the processes (only the best compact grid is rebuilt)'''
+
       best_grid = self.final_results[0][0]
       best_fitness = self.final_results[0][1]
 
@@ -95,4 +415,78 @@ class mp_gpgo():
               best_grid = result[0]
               best_fitness = result[1]
 
-      return best_grid
\ No newline at end of file
+      return best_grid.to_grid()
+
+    def mp_island_algorithm(self,migration_interval = 10,migration_size = 2,topology = "ring"):
+      '''Function to run the genetic algorithm on several CPU cores as an island model : each process evolves its own
+      population (with its own configuration file) and periodically sends its best individuals to the neighbour islands.
+
+      :param migration_interval: number of generations between two migrations, optional (10 by default)
+      :type migration_interval: integer
+      :param migration_size: number of individuals sent to each neighbour, optional (2 by default)
+      :type migration_size: integer
+      :param topology: neighbours of each island, "ring" (next island) or "all" (all the other islands), optional ("ring" by default)
+      :type topology: string
+      :return: returns the best grid of the islands
+      :rtype: class: Grid
+      '''
+
+      if(migration_interval <= 0 or migration_size <= 0):
+        raise Exception("Unexpected migration parameters (not strictly positive) !")
+
+      # Windows support
+      mp.freeze_support()
+
+      #Neighbours of each island
+      if(topology == "ring"):
+        neighbours = [[(pid + 1) % self.nb_proc] for pid in range(self.nb_proc)]
+      elif(topology == "all"):
+        neighbours = [[other for other in range(self.nb_proc) if other != pid] for pid in range(self.nb_proc)]
+      else:
+        raise Exception("Unexpected topology (not 'ring' or 'all') !")
+
+      #--MULTIPROCESSING--
+
+      inboxes = [mp.Queue() for pid in range(self.nb_proc)]
+      results = mp.Queue()
+      lock = mp.RLock()
+
+      islands = []
+      for pid in range(self.nb_proc):
+        island = mp.Process(target = island_pipeline,args = (pid,self.source_files,self.evaluation_files,self.config_files[pid%len(self.config_files)],
+                                                             self.evaluation_corpus,inboxes,neighbours[pid],migration_interval,migration_size,results,lock,
+                                                             self.process_file(self.profile,pid)))
+        island.start()
+        islands.append(island)
+
+      #Results of the islands (received before joining the processes), the failure of an island stops the others
+      final_results = []
+      while len(final_results) < self.nb_proc:
+        try:
+          result = results.get(timeout = 1)
+        except queue.Empty:
+          #Island stopped without sending its result (killed process)
+          for pid,island in enumerate(islands):
+            if(island.exitcode not in (None,0)):
+              stop_processes(islands)
+              raise Exception("Island "+str(pid)+" stopped without result (exit code "+str(island.exitcode)+") !")
+          continue
+
+        #Error of an island : (pid, traceback of the error)
+        if(len(result) == 2):
+          stop_processes(islands)
+          raise Exception("Island "+str(result[0])+" failed !\n"+result[1])
+
+        final_results.append(result)
+
+      for island in islands:
+        island.join()
+
+      #Results in the order of the islands : (compact best grid, fitness, best history, stop reason, phase statistics, (cache hits, cache misses),
+      #(individuals received, individuals accepted))
+      final_results.sort(key = lambda result : result[0])
+      self.final_results = [result[1:] for result in final_results]
+
+      self.merge_profiles()
+
+      return self.best_result()
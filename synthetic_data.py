@@ -0,0 +1,209 @@
+import os
+import csv
+import math
+import random
+import argparse
+import numpy as np
+
+#===============================================
+# SYNTHETIC CORPORA AND GRIDS (LOAD TESTS)
+#===============================================
+
+def synthetic_vocabulary(nb_words):
+    '''Function to get a synthetic vocabulary, the word of rank i is "w<i>" (rank 0 is the most frequent word in a Zipf corpus)
+
+    :param nb_words: size of the vocabulary
+    :type nb_words: integer
+    :return: words of the vocabulary
+    :rtype: list
+    '''
+
+    return ["w"+str(i) for i in range(nb_words)]
+
+def zipf_corpus(output_file,nb_words,nb_tokens,exponent = 1.0,min_length = 3,max_length = 12,cover_vocabulary = True,seed = 0):
+    '''Function to write a corpus whose word frequencies follow a Zipf law (frequency of the rank r proportional to 1/r^exponent).
+    One sentence per line, words separated by a space (format of the corpora of the grids).
+
+    :param output_file: output file (`.txt`)
+    :type output_file: string
+    :param nb_words: size of the vocabulary
+    :type nb_words: integer
+    :param nb_tokens: number of words of the corpus
+    :type nb_tokens: integer
+    :param exponent: exponent of the Zipf law, optional (1.0 by default)
+    :type exponent: float
+    :param min_length: minimal length of a sentence, optional (3 by default)
+    :type min_length: integer
+    :param max_length: maximal length of a sentence, optional (12 by default)
+    :type max_length: integer
+    :param cover_vocabulary: if True, the words never drawn are added at the end of the corpus, so the vocabulary
+                             of the corpus is the whole synthetic vocabulary, optional (True by default)
+    :type cover_vocabulary: boolean
+    :param seed: seed of the random generator, optional (0 by default)
+    :type seed: integer
+    :return: words of the vocabulary (by rank)
+    :rtype: list
+    '''
+
+    if(nb_words <= 0 or nb_tokens <= 0 or min_length <= 0 or max_length < min_length):
+        raise Exception("Unexpected corpus dimensions !")
+
+    rng = np.random.default_rng(seed)
+    words = synthetic_vocabulary(nb_words)
+
+    #Zipf distribution of the ranks
+    probabilities = 1.0 / np.arange(1,nb_words + 1,dtype = np.float64) ** exponent
+    probabilities /= probabilities.sum()
+
+    ranks = rng.choice(nb_words,size = nb_tokens,p = probabilities)
+    lengths = rng.integers(min_length,max_length + 1,size = nb_tokens // min_length + 1)
+
+    with open(output_file,"w",encoding = "utf-8") as file:
+
+        #Sentences of random lengths
+        start = 0
+        for length in lengths:
+            if(start >= nb_tokens):
+                break
+            file.write(" ".join(words[rank] for rank in ranks[start:start + length])+"\n")
+            start += length
+
+        #Words never drawn
+        if(cover_vocabulary):
+            missing = np.setdiff1d(np.arange(nb_words),ranks)
+            for start in range(0,len(missing),max_length):
+                file.write(" ".join(words[rank] for rank in missing[start:start + max_length])+"\n")
+
+    return words
+
+def random_grid(output_file,words,page_row = 5,page_col = 5,max_depth = 3,seed = 0,root_name = "accueil"):
+    '''Function to write a random grid in the csv format of the grids (Grid.load_grid).
+    Pages are added under random pages (depth lower than max_depth) until the words fit in the grid,
+    then the directories and the words are placed in random slots.
+
+    :param output_file: output file (`.csv`)
+    :type output_file: string
+    :param words: words of the grid
+    :type words: list
+    :param page_row: number of rows of the pages, optional (5 by default)
+    :type page_row: integer
+    :param page_col: number of columns of the pages, optional (5 by default)
+    :type page_col: integer
+    :param max_depth: maximal depth of the pages (the root page has the depth 0), optional (3 by default)
+    :type max_depth: integer
+    :param seed: seed of the random generator, optional (0 by default)
+    :type seed: integer
+    :param root_name: name of the root page, optional ("accueil" by default)
+    :type root_name: string
+    :raises Exception: The words can not fit in the pages of the maximal depth !
+    '''
+
+    rng = random.Random(seed)
+    page_size = page_row * page_col
+
+    if(page_size < 2):
+        raise Exception("Unexpected page size (less than 2 slots) !")
+
+    #Page tree : name, parent (index), depth and number of used slots of each page
+    names = [root_name]
+    parents = [-1]
+    depths = [0]
+    used = [0]
+
+    #Pages able to contain a new directory
+    open_pages = [0]
+
+    #Each new page adds page_size - 1 free slots (one slot for its directory)
+    while len(names) * page_size - (len(names) - 1) < len(words):
+
+        if(not open_pages):
+            raise Exception("The words can not fit in the pages of the maximal depth !")
+
+        idx = rng.randrange(len(open_pages))
+        parent = open_pages[idx]
+
+        names.append("page"+str(len(names)))
+        parents.append(parent)
+        depths.append(depths[parent] + 1)
+        used.append(0)
+        used[parent] += 1
+
+        #Page full or at the maximal depth
+        if(used[parent] == page_size):
+            open_pages[idx] = open_pages[-1]
+            open_pages.pop()
+
+        if(depths[-1] < max_depth):
+            open_pages.append(len(names) - 1)
+
+    #Random slots of each page : directories first, then the words
+    slots = [rng.sample(range(page_size),page_size) for name in names]
+    next_slot = [0] * len(names)
+
+    rows = [[] for name in names]
+
+    for page in range(1,len(names)):
+        parent = parents[page]
+        row,col = divmod(slots[parent][next_slot[parent]],page_col)
+        next_slot[parent] += 1
+
+        rows[parent].append([names[page],row,col,names[parent],names[page]+"@"+names[parent],"DIR",names[page],0])
+
+    #Free slots of the whole grid for the words
+    free_slots = [(page,slot) for page in range(len(names)) for slot in slots[page][next_slot[page]:]]
+    rng.shuffle(free_slots)
+
+    for word,(page,slot) in zip(words,free_slots):
+        row,col = divmod(slot,page_col)
+        rows[page].append([word,row,col,names[page],word+"@"+names[page],"NO",None,0])
+
+    with open(output_file,"w",encoding = "utf-8",newline = '') as file:
+        writer = csv.writer(file)
+
+        writer.writerow(['word','row','col','page','identifier','is_dir','link','sim_score',root_name,page_row,page_col])
+
+        #Pages in order of creation (a page is created by its directory before its pictograms are read)
+        for page_rows in rows:
+            writer.writerows(page_rows)
+
+def synthetic_dataset(output_dir,nb_words,nb_tokens,exponent = 1.0,page_row = 5,page_col = 5,max_depth = None,seed = 0):
+    '''Function to write a Zipf corpus and a random grid of its vocabulary in a directory
+
+    :param max_depth: maximal depth of the grid, optional (None by default, depth needed by a tree as wide as possible + 1)
+    :type max_depth: integer
+    :return: paths of the corpus and of the grid
+    :rtype: string,string
+    '''
+
+    os.makedirs(output_dir,exist_ok = True)
+
+    corpus_file = os.path.join(output_dir,"zipf_"+str(nb_words)+".txt")
+    grid_file = os.path.join(output_dir,"grid_"+str(nb_words)+".csv")
+
+    words = zipf_corpus(corpus_file,nb_words,nb_tokens,exponent,seed = seed)
+
+    if(max_depth == None):
+        max_depth = int(math.ceil(math.log(max(nb_words,2),page_row * page_col))) + 1
+
+    random_grid(grid_file,words,page_row,page_col,max_depth,seed)
+
+    return corpus_file,grid_file
+
+
+if(__name__ == "__main__"):
+
+    parser = argparse.ArgumentParser(description = "Synthetic Zipf corpus and random grid generator")
+    parser.add_argument("output_dir",help = "output directory")
+    parser.add_argument("--words",type = int,default = 10000,help = "size of the vocabulary")
+    parser.add_argument("--tokens",type = int,default = 1000000,help = "number of words of the corpus")
+    parser.add_argument("--exponent",type = float,default = 1.0,help = "exponent of the Zipf law")
+    parser.add_argument("--page-row",type = int,default = 5,help = "number of rows of the pages")
+    parser.add_argument("--page-col",type = int,default = 5,help = "number of columns of the pages")
+    parser.add_argument("--max-depth",type = int,default = None,help = "maximal depth of the pages")
+    parser.add_argument("--seed",type = int,default = 0,help = "seed of the random generators")
+    args = parser.parse_args()
+
+    corpus_file,grid_file = synthetic_dataset(args.output_dir,args.words,args.tokens,args.exponent,args.page_row,args.page_col,
+                                              args.max_depth,args.seed)
+    print(corpus_file)
+    print(grid_file)
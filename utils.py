@@ -3,6 +3,7 @@ import numpy as np
 import pandas as pd
 import codecs
 import json
+import os
 
 def dot_product(v_a,v_b):
     '''Function to compute the dot product between two vectors'''
@@ -57,55 +58,200 @@ def get_vocabulary_from_csv(input_file, separator = ","):
     
     return voc
 
+#Parsed corpora : ((file, modification time), ...) -> frequency of each word (in order of appearance)
+corpus_frequencies = dict()
+
+def get_vocabulary_frequencies(corpus):
+    '''Function that will find the whole vocabulary from the input corpus with the frequency of each word.
+    The result is cached for the set of files (and their modification times), the corpus is parsed only once.
+    
+    :param corpus: Corpus containing multiple '.txt' files.
+    :type corpus: list of 'txt' files.
+    :return: Number of occurrences of each word, in order of first appearance
+    :rtype: dict
+    '''
+
+    key = tuple((file_path,os.path.getmtime(file_path)) for file_path in corpus)
+
+    if(key not in corpus_frequencies):
+
+        #Initialization of the vocabulary (ordered set) with the frequencies
+        frequencies = dict()
+
+        for file_path in corpus:
+            #Read the input txt file
+            with codecs.open(file_path,"r","utf_8") as rawFile:
+
+                #For each line in the file, split the line
+                for line in rawFile:
+                    sentence = line.strip()
+                    sentence = sentence.lower()
+                    splittedLine = sentence.split(" ")
+
+                    #For each word in the splitted line, count it in the vocabulary of the corpus
+                    for word in splittedLine:
+                        frequencies[word] = frequencies.get(word,0) + 1
+
+        corpus_frequencies.update({key : frequencies})
+
+    return dict(corpus_frequencies[key])
+
 def get_vocabulary_from_corpus(corpus):
     '''Function that will find the whole vocabulary from the input corpus
     
     :param corpus: Corpus containing multiple '.txt' files.
     :type corpus: list of 'txt' files.
+    :return: Words of the corpus in order of first appearance (new list)
+    :rtype: list
     '''
 
-    #Initialization of the vocabulary to return
-    voc = []
+    return list(get_vocabulary_frequencies(corpus))
 
-    for file_path in corpus:
-        #Read the input txt file
-        with codecs.open(file_path,"r","utf_8") as rawFile:
+class SimilarityRow():
+    '''Row of a binary similarity matrix, indexed by words (sim_matrix[wi][wj])'''
 
-            #For each line in the file, split the line
-            for line in rawFile:
-                sentence = line.strip()
-                sentence = sentence.lower()
-                splittedLine = sentence.split(" ")
+    def __init__(self,values,word_ids):
+        '''Constructor'''
 
-                #For each word in the splitted line, store it in the vocabulary of the corpus
-                for word in splittedLine:
-                    if(word not in voc):
-                        voc.append(word)
-        rawFile.close()
+        self.values = values
+        self.word_ids = word_ids
 
-    return voc
+    def __getitem__(self,word):
+
+        return float(self.values[self.word_ids[word]])
+
+    def __contains__(self,word):
+
+        return word in self.word_ids
+
+class SimilarityMatrix():
+    '''Dense similarity matrix (float32, float64 for the JSON matrices) with its vocabulary index.
+    It is indexed by words like the JSON dictionaries (sim_matrix[wi][wj]).
+
+    :param words: vocabulary of the matrix (row and column order)
+    :type words: list
+    :param matrix: similarity values (array or memory-mapped array)
+    :type matrix: numpy array
+    '''
+
+    def __init__(self,words,matrix):
+        '''Constructor'''
+
+        self.words = list(words)
+        self.word_ids = {word : i for i,word in enumerate(self.words)}
+        self.matrix = matrix
+
+    def __getitem__(self,word):
+
+        return SimilarityRow(self.matrix[self.word_ids[word]],self.word_ids)
+
+    def __contains__(self,word):
+
+        return word in self.word_ids
+
+    def __len__(self):
+
+        return len(self.words)
+
+    def to_dict(self):
+        '''Method to get the matrix as a dictionary of dictionaries (JSON format)'''
+
+        return {wi : {wj : float(self.matrix[i][j]) for j,wj in enumerate(self.words)} for i,wi in enumerate(self.words)}
+
+def similarity_vocabulary_file(matrix_file):
+    '''Function to get the vocabulary file stored next to a binary similarity matrix (name.npy -> name_voc.json)'''
+
+    return os.path.splitext(matrix_file)[0] + "_voc.json"
+
+def dict_to_similarity_matrix(sim_matrix,dtype = np.float32):
+    '''Function to convert a similarity dictionary of dictionaries into a dense similarity matrix'''
+
+    words = list(sim_matrix)
+    matrix = np.zeros((len(words),len(words)),dtype = dtype)
+
+    for i,wi in enumerate(words):
+        row = sim_matrix[wi]
+        matrix[i] = [row[wj] for wj in words]
+
+    return SimilarityMatrix(words,matrix)
 
 def store_similarity_matrix(sim_matrix,output_file = "sim_default.json"):
+    '''Function to store a similarity matrix, as a JSON dictionary (.json) or
+    as a float32 matrix (.npy) with its vocabulary file (_voc.json)'''
 
-    #File opening
-    similarity_file = codecs.open(output_file,"w","utf-8")
+    #Binary format
+    if(output_file.endswith(".npy")):
 
-    #Store the similarity matrix
-    tmp = json.dumps(sim_matrix)
-    similarity_file.write(tmp)
-    similarity_file.close()
+        if(not isinstance(sim_matrix,SimilarityMatrix)):
+            sim_matrix = dict_to_similarity_matrix(sim_matrix)
 
-def load_similarity_matrix(input_file):
+        np.save(output_file,np.asarray(sim_matrix.matrix,dtype = np.float32))
 
-    if(input_file.endswith(".json")):
+        with codecs.open(similarity_vocabulary_file(output_file),"w","utf-8") as vocabulary_file:
+            vocabulary_file.write(json.dumps(sim_matrix.words))
+
+    #JSON format
+    else:
+
+        if(isinstance(sim_matrix,SimilarityMatrix)):
+            sim_matrix = sim_matrix.to_dict()
 
         #File opening
-        similarity_file = codecs.open(input_file,"r","utf-8")
+        similarity_file = codecs.open(output_file,"w","utf-8")
 
-        #Load the similarity matrix
-        sim_matrix = json.load(similarity_file)
+        #Store the similarity matrix
+        tmp = json.dumps(sim_matrix)
+        similarity_file.write(tmp)
+        similarity_file.close()
 
-        return sim_matrix
+#Similarity matrices already loaded, by file (and modification time)
+similarity_matrices = dict()
 
-    else:
-        raise Exception("Not correct file format, .json was expected !")
\ No newline at end of file
+def load_similarity_matrix(input_file):
+    '''Function to load a similarity matrix. A binary matrix (.npy) is memory-mapped (read only),
+    so the processes loading the same file share its pages. A JSON matrix is converted once into a dense float64 matrix.
+    The matrix is cached for the file (and its modification time) and shared by the callers, it must not be modified.'''
+
+    if(not input_file.endswith(".json") and not input_file.endswith(".npy")):
+        raise Exception("Not correct file format, .json or .npy was expected !")
+
+    key = (input_file,os.path.getmtime(input_file))
+
+    if(key not in similarity_matrices):
+
+        if(input_file.endswith(".json")):
+
+            #File opening
+            with codecs.open(input_file,"r","utf-8") as similarity_file:
+
+                #Load the similarity matrix (dense matrix used by the evaluators without conversion)
+                sim_matrix = dict_to_similarity_matrix(json.load(similarity_file),dtype = np.float64)
+
+        else:
+
+            with codecs.open(similarity_vocabulary_file(input_file),"r","utf-8") as vocabulary_file:
+                words = json.load(vocabulary_file)
+
+            sim_matrix = SimilarityMatrix(words,np.load(input_file,mmap_mode = "r"))
+
+        similarity_matrices.update({key : sim_matrix})
+
+    return similarity_matrices[key]
+
+def convert_similarity_matrix(input_file,output_file = None):
+    '''Function to convert a JSON similarity matrix into the binary format (.npy and _voc.json)
+
+    :param input_file: JSON similarity matrix
+    :type input_file: file (`.json`)
+    :param output_file: binary matrix, optional (same name with the .npy extension by default)
+    :type output_file: file (`.npy`)
+    :return: path of the binary matrix
+    :rtype: string
+    '''
+
+    if(output_file == None):
+        output_file = os.path.splitext(input_file)[0] + ".npy"
+
+    store_similarity_matrix(load_similarity_matrix(input_file),output_file)
+
+    return output_file